@@ -0,0 +1,111 @@
+"""
+Fused-loop evaluation of compiled plans, just-in-time compiled with numba when it is installed.
+
+The NumPy evaluator runs each instruction of a plan over the whole frequency array, streaming one intermediate array
+per register through memory. The kernel here instead runs the whole program at one frequency point at a time, keeping
+the registers in a small local array, so no intermediate arrays are created at all.
+
+.. moduleauthor:: whileman133
+
+"""
+
+import numpy as np
+
+from .compiled import OP_R, OP_L, OP_C, OP_SERIES, OP_PARALLEL, OP_STORE, OP_LOAD
+
+
+def _kernel(ops, args, dests, nregisters, values, s, out):
+    """
+    Evaluate a plan program point by point.
+
+    :param ops: Opcode of each instruction.
+    :param args: Argument of each instruction.
+    :param dests: Destination register of each instruction.
+    :param nregisters: Number of registers used by the program.
+    :param values: (n_batch, n_leaves) array of leaf values.
+    :param s: (n_freq,) array of the Laplace variable.
+    :param out: (n_batch, n_freq) array receiving the impedance.
+    """
+
+    reg = np.empty(nregisters, dtype=out.dtype)
+    for b in range(values.shape[0]):
+        for k in range(s.shape[0]):
+            sk = s[k]
+            for i in range(ops.shape[0]):
+                op = ops[i]
+                a = args[i]
+                d = dests[i]
+                if op == OP_R:
+                    reg[d] = values[b, a]
+                elif op == OP_L:
+                    reg[d] = sk * values[b, a]
+                elif op == OP_C:
+                    reg[d] = 1 / (sk * values[b, a])
+                elif op == OP_SERIES:
+                    acc = reg[d]
+                    for j in range(d + 1, d + a):
+                        acc += reg[j]
+                    reg[d] = acc
+                elif op == OP_PARALLEL:
+                    acc = 0j
+                    for j in range(d, d + a):
+                        acc += 1 / reg[j]
+                    reg[d] = 1 / acc
+                elif op == OP_STORE:
+                    reg[a] = reg[d]
+                else:
+                    reg[d] = reg[a]
+            out[b, k] = reg[0]
+
+
+try:
+    import numba
+except ImportError:
+    kernel = None
+else:
+    # numpy error model: division by zero yields inf/nan as in the NumPy evaluator rather than raising
+    kernel = numba.njit(cache=True, nogil=True, error_model='numpy')(_kernel)
+
+
+def encode(program: list) -> tuple:
+    """
+    Encode a plan program as the arrays taken by the kernel.
+
+    :return tuple: Opcode, argument, and destination arrays.
+    """
+
+    ops, args, dests = zip(*program)
+    return np.array(ops, dtype=np.int64), np.array(args, dtype=np.int64), np.array(dests, dtype=np.int64)
+
+
+def run(fn, encoded: tuple, nregisters: int, grid, values: list, result: np.ndarray):
+    """
+    Evaluate a plan program with a kernel function, storing the impedance in the result array.
+
+    :param fn: The kernel, compiled or not.
+    :param tuple encoded: The program, as returned by :func:`encode`.
+    :param int nregisters: Number of registers used by the program.
+    :param FrequencyGrid grid: The frequencies at which to evaluate the impedance.
+    :param list values: Leaf values, scalars or arrays shaped for broadcasting against the frequency grid.
+    :param result: Complex array of the broadcast shape of the parameters and frequencies.
+    """
+
+    gnd = len(grid.shape)
+    batch = result.shape[:result.ndim - gnd]
+    nb = int(np.prod(batch, dtype=np.int64))
+
+    # leaf values as an (n_batch, n_leaves) matrix, dropping the singleton frequency axes of array values
+    table = np.empty((nb, len(values)), dtype=grid.real_dtype)
+    for i, v in enumerate(values):
+        v = np.asarray(v, dtype=grid.real_dtype)
+        if v.ndim:
+            v = v.reshape(v.shape[:v.ndim - gnd])
+        table[:, i] = np.broadcast_to(v, batch).ravel()
+
+    s = np.atleast_1d(np.asarray(grid.s, dtype=grid.dtype))
+    if result.flags.c_contiguous:
+        fn(*encoded, nregisters, table, s, result.reshape(nb, len(s)))
+    else:
+        out = np.empty((nb, len(s)), dtype=result.dtype)
+        fn(*encoded, nregisters, table, s, out)
+        result[...] = out.reshape(result.shape)
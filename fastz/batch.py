@@ -0,0 +1,160 @@
+"""
+Batch evaluation of impedance networks over many parameter sets, optionally across a pool of worker processes.
+
+Worker processes receive the impedance tree once, on startup, and compile their own evaluation plan. The frequency
+vector, the parameter samples, and the result array live in shared memory, so each task submitted to the pool is
+only a pair of sample indices and results are written in place rather than pickled back.
+
+.. moduleauthor:: whileman133
+
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union, Dict
+import os
+import numpy as np
+
+from .core import FrequencyGrid, Z
+
+
+def evaluate(z: Z, ff: Union[FrequencyGrid, np.ndarray], workers: int = None, chunk: int = 4096,
+             magnitude: bool = False, dtype=None, **lumpedparam) -> np.ndarray:
+    """
+    Evaluate an impedance for a batch of parameter sets.
+
+    :param Z z: The impedance to evaluate.
+    :param ff: The frequencies (in Hz) at which to evaluate the impedance, 1D numpy array or frequency grid.
+    :param int workers: (optional) Number of worker processes. The batch is evaluated in this process if omitted
+        or 1; pass 0 to use one worker per CPU.
+    :param int chunk: The number of parameter sets evaluated per vectorized pass (and per task submitted to the pool).
+    :param bool magnitude: Return impedance magnitudes rather than complex impedances.
+    :param dtype: (optional) Complex dtype of the evaluation, complex128 or complex64 for single precision, in which
+        case magnitudes are float32. Defaults to the dtype of a frequency grid, otherwise to complex128.
+    :param lumpedparam: Values for lumped elements. 1D numpy arrays hold one value per parameter set and must all have
+        the same length; scalar values are shared by all parameter sets.
+    :return: Numpy array of shape (n_sets, n_freq) holding the impedance (in Ohms) for each parameter set.
+    :raises ValueError: when no array-valued parameters are supplied or their lengths differ.
+    """
+
+    grid = FrequencyGrid.of(ff, dtype)
+    samples = {label: np.asarray(v) for label, v in lumpedparam.items() if np.ndim(v)}
+    scalars = {label: v for label, v in lumpedparam.items() if not np.ndim(v)}
+
+    lengths = {len(v) for v in samples.values()}
+    if len(lengths) != 1 or any(v.ndim != 1 for v in samples.values()):
+        raise ValueError(f"Expected 1D parameter arrays of equal length, got shapes "
+                         f"{', '.join(str(v.shape) for v in samples.values()) or 'none'}.")
+    n = lengths.pop()
+
+    return run(z, grid, n, samples, scalars, workers=workers, chunk=chunk, magnitude=magnitude)
+
+
+def run(z: Z, grid: FrequencyGrid, n: int, samples: Dict[str, np.ndarray], scalars: dict, workers: int = None,
+        chunk: int = 4096, magnitude: bool = False) -> np.ndarray:
+    """
+    Evaluate an impedance for n parameter sets; the engine behind :func:`evaluate` and the Monte Carlo analysis.
+
+    :param Z z: The impedance to evaluate.
+    :param FrequencyGrid grid: The frequencies at which to evaluate the impedance, also setting the precision.
+    :param int n: The number of parameter sets.
+    :param dict samples: 1D numpy arrays of n values, keyed by element label.
+    :param dict scalars: Values shared by all parameter sets, keyed by element label.
+    :param int workers: (optional) Number of worker processes, see :func:`evaluate`.
+    :param int chunk: The number of parameter sets evaluated per vectorized pass.
+    :param bool magnitude: Return impedance magnitudes rather than complex impedances.
+    :return: Numpy array of shape (n, n_freq) holding the impedance (in Ohms) for each parameter set.
+    """
+
+    if workers == 0:
+        workers = os.cpu_count()
+
+    dtype = grid.real_dtype if magnitude else grid.dtype
+
+    if not workers or workers == 1:
+        result = np.empty((n,) + grid.shape, dtype=dtype)
+        _evaluate_chunks(z.compile(), grid, samples, scalars, result, 0, n, chunk)
+        return result
+
+    # imported here as shared memory is only needed, and only available (Python 3.8+), for process pools
+    from multiprocessing import shared_memory
+
+    blocks = []
+
+    def share(array: np.ndarray) -> tuple:
+        """Copy an array into a new shared-memory block and return the descriptor used to attach to it."""
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        blocks.append(block)
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+        return block.name, array.shape, array.dtype.str
+
+    try:
+        ff_desc = share(np.asarray(grid.ff, dtype=float))
+        sample_desc = {label: share(v) for label, v in samples.items()}
+        result_desc = share(np.empty((n,) + grid.shape, dtype=dtype))
+
+        with ProcessPoolExecutor(workers, initializer=_worker_init,
+                                 initargs=(z, ff_desc, grid.dtype.str, sample_desc, scalars, result_desc)) as pool:
+            futures = [pool.submit(_worker_run, start, min(start + chunk, n), chunk)
+                       for start in range(0, n, chunk)]
+            for future in futures:
+                future.result()
+
+        return _attach(blocks[-1], result_desc).copy()
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def _evaluate_chunks(plan, grid: FrequencyGrid, samples: dict, scalars: dict, result: np.ndarray,
+                     start: int, stop: int, chunk: int):
+    """Evaluate parameter sets [start, stop) into the corresponding rows of the result, chunk sets at a time."""
+
+    if not samples:
+        # nothing varies between parameter sets
+        z = plan(grid, **scalars)
+        result[start:stop] = np.abs(z) if result.dtype.kind == 'f' else z
+        return
+
+    buf = np.empty((min(chunk, stop - start),) + grid.shape, dtype=grid.dtype)
+    for i in range(start, stop, chunk):
+        j = min(i + chunk, stop)
+        params = dict(scalars)
+        params.update((label, v[i:j]) for label, v in samples.items())
+        out = buf[:j - i]
+        plan(grid, out=out, **params)
+        if result.dtype.kind == 'f':
+            np.abs(out, out=result[i:j])
+        else:
+            result[i:j] = out
+
+
+def _attach(block, desc: tuple) -> np.ndarray:
+    """View a shared-memory block as a numpy array."""
+
+    _, shape, dtype = desc
+    return np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+
+
+# state of a worker process, set up once by the pool initializer
+_worker = {}
+
+
+def _worker_init(z: Z, ff_desc: tuple, dtype: str, sample_desc: dict, scalars: dict, result_desc: tuple):
+    from multiprocessing import shared_memory
+
+    def attach(desc):
+        block = shared_memory.SharedMemory(name=desc[0])
+        _worker.setdefault('blocks', []).append(block)  # keep the block open for the life of the worker
+        return _attach(block, desc)
+
+    _worker['plan'] = z.compile()
+    _worker['grid'] = FrequencyGrid(attach(ff_desc), dtype)
+    _worker['samples'] = {label: attach(desc) for label, desc in sample_desc.items()}
+    _worker['scalars'] = scalars
+    _worker['result'] = attach(result_desc)
+
+
+def _worker_run(start: int, stop: int, chunk: int):
+    _evaluate_chunks(_worker['plan'], _worker['grid'], _worker['samples'], _worker['scalars'], _worker['result'],
+                     start, stop, chunk)
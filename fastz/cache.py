@@ -0,0 +1,169 @@
+"""
+Memoization of sub-tree impedances across evaluations.
+
+.. moduleauthor:: whileman133
+
+"""
+
+from collections import OrderedDict
+from typing import Tuple
+import numpy as np
+
+from .core import FrequencyGrid, Z, LumpedElement, CompositeZ
+
+
+class EvalCache:
+    """
+    Bounded least-recently-used cache of sub-tree impedances.
+
+    Pass a cache to the call operator of an impedance, ``Z(ff, cache=cache, **lumpedparam)``, to memoize the
+    impedance of every composite in the tree. An entry is keyed by the composite, the frequency grid, and the values
+    of just those parameters that name elements within the composite, so a sweep over one element recomputes only
+    the composites on the path from that element to the root; all other sub-trees are fetched from the cache.
+
+    Entries are evicted, least recently used first, once their total size exceeds the cache's memory bound. Tree
+    modifications are tracked by a single process-wide revision counter, so modifying any impedance tree in place,
+    even one never evaluated with this cache, drops every entry, along with the compiled plans, label indexes, and
+    generated functions cached on all trees. Frozen sub-trees (see :meth:`Z.freeze`) are exempt from invalidation
+    and are keyed by structure rather than identity, so structurally equal copies share entries.
+
+    .. note::
+
+        Pass a :class:`FrequencyGrid` rather than a frequency array when evaluating repeatedly, so that the grid's
+        fingerprint is computed once instead of on every call.
+    """
+
+    def __init__(self, maxbytes: int = 64 << 20):
+        """
+        Initialize an empty cache.
+
+        :param int maxbytes: Memory bound on the cached impedance arrays, in bytes.
+        """
+
+        self.maxbytes = maxbytes
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._labels = {}
+        self._revision = Z._revision
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {len(self._entries)} entries, {self._nbytes}/{self.maxbytes} bytes, " \
+               f"{self.hits} hits, {self.misses} misses, {self.evictions} evictions>"
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of the cached impedance arrays, in bytes."""
+        return self._nbytes
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups served from the cache, 0 when there have been no lookups."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self):
+        """Remove every entry and reset the statistics."""
+
+        self._entries.clear()
+        self._labels.clear()
+        self._nbytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def evaluate(self, z: Z, grid: FrequencyGrid, lumpedparam: dict):
+        """
+        Evaluate an impedance, fetching and storing the impedances of its composites in this cache.
+
+        :param Z z: The impedance to evaluate.
+        :param FrequencyGrid grid: The frequencies at which to evaluate the impedance.
+        :param dict lumpedparam: Dictionary of parameter values to associate with lumped elements.
+        :return: The complex impedance (in Ohms) at the frequencies of the grid.
+        """
+
+        if self._revision != Z._revision:
+            # a tree was modified; cached impedances and label sets may be stale, except those of frozen sub-trees
+            for key in [key for key in self._entries if not isinstance(key[0], Z)]:
+                self._nbytes -= np.asarray(self._entries.pop(key)[1]).nbytes
+            for key in [key for key in self._labels if not isinstance(key, Z)]:
+                del self._labels[key]
+            self._revision = Z._revision
+
+        fingerprints = {label: _fingerprint(value) for label, value in lumpedparam.items()}
+        z = self._evaluate(z, grid, lumpedparam, fingerprints)
+
+        # the caller owns the result; never hand out an array that is held in the cache
+        return z.copy() if isinstance(z, np.ndarray) else z
+
+    def _evaluate(self, z: Z, grid: FrequencyGrid, lumpedparam: dict, fingerprints: dict):
+        if isinstance(z, LumpedElement):
+            return z._evaluate(grid, lumpedparam)
+
+        key = (_node_key(z), grid.fingerprint) + tuple(fingerprints.get(label) for label in self._labels_in(z))
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        self.misses += 1
+        composite = _as_composite(z)
+        result = composite._combine(self._evaluate(child, grid, lumpedparam, fingerprints)
+                                    for child in composite._children)
+        self._store(key, z, result)
+        return result
+
+    def _store(self, key: tuple, z: Z, result):
+        nbytes = np.asarray(result).nbytes
+        if nbytes > self.maxbytes:
+            return
+
+        # the entry holds a reference to the impedance so that its id cannot be reused while the entry exists
+        self._entries[key] = (z, result)
+        self._nbytes += nbytes
+        while self._nbytes > self.maxbytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._nbytes -= np.asarray(evicted).nbytes
+            self.evictions += 1
+
+    def _labels_in(self, z: Z) -> Tuple[str]:
+        """Return the sorted labels of the lumped elements within a sub-tree, memoized per sub-tree."""
+
+        entry = self._labels.get(_node_key(z))
+        if entry is None:
+            found = set()
+            stack = [z]
+            while stack:
+                node = stack.pop()
+                if isinstance(node, LumpedElement):
+                    found.add(node.label)
+                else:
+                    stack.extend(_as_composite(node)._children)
+            # as for cached impedances, hold a reference to the sub-tree so that its id is not reused
+            entry = self._labels[_node_key(z)] = (z, tuple(sorted(found)))
+        return entry[1]
+
+
+def _node_key(z: Z):
+    """Key of a sub-tree in the cache: frozen sub-trees by structure, so that equal copies share entries."""
+    return z if z.frozen else id(z)
+
+
+def _fingerprint(value):
+    """Return a hashable stand-in for a parameter value, scalar or numpy array."""
+
+    value = np.asarray(value)
+    if value.ndim == 0:
+        # numpy scalars and 0-d arrays by their Python value; 0-d arrays are unhashable
+        return value.item()
+    return hash((value.shape, value.dtype.str, value.tobytes()))
+
+
+def _as_composite(node: Z) -> CompositeZ:
+    if not isinstance(node, CompositeZ):
+        raise TypeError(f"Cannot evaluate impedance of type '{type(node).__name__}' through a cache.")
+    return node
@@ -0,0 +1,323 @@
+"""
+Compact, array-backed storage and vectorized evaluation of many impedance networks.
+
+.. moduleauthor:: whileman133
+
+"""
+
+from typing import Union, Iterable, List
+import json
+import os
+import numpy as np
+
+from .core import FrequencyGrid, Z, R, L, C, SeriesZ, ParallelZ, LumpedElement, CompositeZ
+
+# node kinds
+KIND_R = 0
+KIND_L = 1
+KIND_C = 2
+KIND_SERIES = 3
+KIND_PARALLEL = 4
+
+_KINDS = {R: KIND_R, L: KIND_L, C: KIND_C, SeriesZ: KIND_SERIES, ParallelZ: KIND_PARALLEL}
+_TYPES = {kind: t for t, kind in _KINDS.items()}
+
+# arrays saved by CompactNetwork.save, one .npy file each
+_ARRAYS = ('kinds', 'subscripts', 'values', 'offsets', 'children', 'roots')
+
+# target size of the impedance scratch array of one pass of CompactNetwork.evaluate
+CHUNK_BYTES = 64 << 20
+
+
+class CompactNetwork:
+    """
+    Forest of impedance networks stored as a handful of flat arrays rather than a graph of Python objects.
+
+    Each node of each network is one entry in the following arrays:
+
+    - kinds: node type code, one of ``KIND_R``, ``KIND_L``, ``KIND_C``, ``KIND_SERIES``, ``KIND_PARALLEL``;
+    - subscripts: index of the node's subscript in the string table :attr:`table`;
+    - values: element value, NaN for composites and for elements without a value;
+    - offsets, children: the children of node i are ``children[offsets[i]:offsets[i + 1]]``.
+
+    Nodes are numbered in post-order, network after network, so children precede their parents and network k
+    occupies the nodes ``roots[k - 1] + 1`` through ``roots[k]``. Sub-trees shared within a network are stored once.
+    A million small networks take tens of megabytes rather than gigabytes, pickle as a few array buffers, and can be
+    saved and memory-mapped for sharing between processes.
+
+    Networks are evaluated directly from the arrays, all networks of a chunk at once: elements by type, then
+    composites one tree level at a time, each level reduced with a single ufunc call.
+
+    .. note::
+
+        Conversion from impedance trees is lossless except for element tolerances, which are not stored.
+    """
+
+    def __init__(self, kinds: np.ndarray, subscripts: np.ndarray, values: np.ndarray, offsets: np.ndarray,
+                 children: np.ndarray, roots: np.ndarray, table: List[Union[str, int]]):
+        """
+        Initialize a compact network from its arrays; see :meth:`from_trees` to convert impedance trees.
+
+        :raises ValueError: when the arrays are inconsistent.
+        """
+
+        n = len(kinds)
+        if not (len(subscripts) == len(values) == n and len(offsets) == n + 1 and offsets[-1] == len(children)):
+            raise ValueError(f"Inconsistent compact network arrays for {n} nodes.")
+
+        self.kinds = kinds
+        self.subscripts = subscripts
+        self.values = values
+        self.offsets = offsets
+        self.children = children
+        self.roots = roots
+        self.table = list(table)
+        self._levels = None
+
+    @classmethod
+    def from_trees(cls, trees: Iterable[Z]) -> "CompactNetwork":
+        """
+        Convert impedance trees to a compact network.
+
+        :param trees: The impedance trees, made of :class:`R`, :class:`L`, :class:`C`, :class:`SeriesZ`, and
+            :class:`ParallelZ` nodes with scalar values.
+        :return CompactNetwork: The compact network, one network per tree, in order.
+        :raises TypeError: when a tree contains another impedance type.
+        :raises ValueError: when an element has an array value.
+        """
+
+        kinds, subscripts, values, counts, children, roots = [], [], [], [], [], []
+        table = {}  # (type, subscript) -> index; keeps 1 and '1' apart
+
+        for tree in trees:
+            # iterative post-order walk; shared sub-trees are numbered once per network
+            numbers = {}
+            stack = [(tree, False)]
+            while stack:
+                node, expanded = stack.pop()
+                if id(node) in numbers:
+                    continue
+                if isinstance(node, CompositeZ) and not expanded:
+                    stack.append((node, True))
+                    stack.extend((child, False) for child in reversed(node._children))
+                    continue
+                if type(node) not in _KINDS:
+                    raise TypeError(f"Cannot store impedance of type '{type(node).__name__}' in a compact network.")
+                kinds.append(_KINDS[type(node)])
+                subscripts.append(table.setdefault((type(node.subscript), node.subscript), len(table)))
+                if isinstance(node, LumpedElement):
+                    if np.ndim(node.value):
+                        raise ValueError(f"Cannot store array value of element '{node.label}' in a compact network.")
+                    values.append(np.nan if node.value is None else node.value)
+                    counts.append(0)
+                else:
+                    values.append(np.nan)
+                    counts.append(len(node._children))
+                    children.extend(numbers[id(child)] for child in node._children)
+                numbers[id(node)] = len(kinds) - 1
+            roots.append(numbers[id(tree)])
+
+        offsets = np.zeros(len(kinds) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(np.array(kinds, dtype=np.int8), np.array(subscripts, dtype=np.int32),
+                   np.array(values, dtype=float), offsets, np.array(children, dtype=np.int64),
+                   np.array(roots, dtype=np.int64), [subscript for _, subscript in table])
+
+    @classmethod
+    def from_tree(cls, z: Z) -> "CompactNetwork":
+        """Convert one impedance tree to a compact network of one network, see :meth:`from_trees`."""
+        return cls.from_trees([z])
+
+    def to_tree(self, k: int) -> Z:
+        """
+        Convert one network back to an impedance tree.
+
+        :param int k: Index of the network.
+        :return Z: The impedance tree, sharing the sub-trees that the original tree shared.
+        """
+
+        start, stop = self._span(k)
+        nodes = {}
+        for i in range(start, stop):
+            kind = int(self.kinds[i])
+            subscript = self.table[self.subscripts[i]]
+            if kind in (KIND_SERIES, KIND_PARALLEL):
+                children = [nodes[int(j)] for j in self.children[self.offsets[i]:self.offsets[i + 1]]]
+                nodes[i] = _TYPES[kind](*children, subscript=subscript)
+            else:
+                value = float(self.values[i])
+                nodes[i] = _TYPES[kind](subscript, v=None if np.isnan(value) else value)
+        return nodes[stop - 1]
+
+    def to_trees(self) -> List[Z]:
+        """Convert every network back to an impedance tree, see :meth:`to_tree`."""
+        return [self.to_tree(k) for k in range(len(self))]
+
+    def __len__(self):
+        return len(self.roots)
+
+    def __getitem__(self, k: int) -> Z:
+        return self.to_tree(k)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {len(self)} networks, {len(self.kinds)} nodes, {self.nbytes} bytes>"
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of the arrays, in bytes."""
+        return sum(getattr(self, name).nbytes for name in _ARRAYS)
+
+    def __getstate__(self):
+        # levels are cheap to recompute
+        state = self.__dict__.copy()
+        state['_levels'] = None
+        return state
+
+    def save(self, path: str):
+        """
+        Save the network to a directory, one .npy file per array, for loading with :meth:`load`.
+
+        :param str path: The directory, created if it does not exist.
+        """
+
+        os.makedirs(path, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, 'table.json'), 'w') as f:
+            json.dump(self.table, f)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = 'r') -> "CompactNetwork":
+        """
+        Load a network saved with :meth:`save`.
+
+        :param str path: The directory.
+        :param str mmap_mode: Memory-map mode of the arrays as for :func:`numpy.load`, None to read them into memory.
+            Memory-mapped arrays are read on demand and shared by all processes mapping the same files.
+        :return CompactNetwork: The network.
+        """
+
+        arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in _ARRAYS]
+        with open(os.path.join(path, 'table.json')) as f:
+            table = json.load(f)
+        return cls(*arrays, table)
+
+    def evaluate(self, ff: Union[FrequencyGrid, np.ndarray, float], chunk: int = None, dtype=None,
+                 **lumpedparam) -> np.ndarray:
+        """
+        Evaluate the impedance of every network.
+
+        :param ff: The cyclic frequency or frequencies (in Hz) at which to evaluate the impedances, float or 1D numpy
+            array.
+        :param int chunk: (optional) Number of networks evaluated per vectorized pass. By default passes are sized
+            so that the impedances of their nodes take about :data:`CHUNK_BYTES`.
+        :param dtype: (optional) Complex dtype of the evaluation, complex128 (the default) or complex64.
+        :param lumpedparam: Values of lumped elements, keyed by label as for :meth:`Z.__call__`. A scalar applies to
+            the element(s) with the label in every network, and a 1D array supplies one value per network.
+        :return: Numpy array of shape (n_networks, n_freq) holding the impedance (in Ohms) of each network.
+        :raises ValueError: when an element has no value or an array value has the wrong length.
+        """
+
+        grid = FrequencyGrid.of(ff, dtype)
+        values = self._resolve(lumpedparam)
+        result = np.empty((len(self),) + grid.shape, dtype=grid.dtype)
+
+        if chunk is None:
+            per_network = max(1, len(self.kinds) // max(1, len(self))) * max(1, grid.size) * grid.dtype.itemsize
+            chunk = max(1, CHUNK_BYTES // per_network)
+
+        for k in range(0, len(self), chunk):
+            stop = min(k + chunk, len(self))
+            lo, hi = self._span(k)[0], int(self.roots[stop - 1]) + 1
+            zz = self._evaluate_nodes(grid, values, lo, hi)
+            result[k:stop] = zz[self.roots[k:stop] - lo]
+        return result
+
+    def _span(self, k: int) -> tuple:
+        """Return the range of node indices of network k."""
+        return (int(self.roots[k - 1]) + 1 if k else 0), int(self.roots[k]) + 1
+
+    def _resolve(self, lumpedparam: dict) -> np.ndarray:
+        """
+        Build the value array for one evaluation from the stored values and the parameter overrides.
+
+        :raises ValueError: when an element has no value or an array value has the wrong length.
+        """
+
+        values = self.values
+        for label, value in lumpedparam.items():
+            kind = {'R': KIND_R, 'L': KIND_L, 'C': KIND_C}.get(label[:1])
+            matches = [i for i, subscript in enumerate(self.table) if str(subscript) == label[1:]]
+            if kind is None or not matches:
+                continue
+            mask = (self.kinds == kind) & np.isin(self.subscripts, matches)
+            if values is self.values:
+                values = np.array(self.values)
+            if np.ndim(value):
+                value = np.asarray(value, dtype=float)
+                if value.shape != (len(self),):
+                    raise ValueError(f"Expected one value of '{label}' per network ({len(self)}), "
+                                     f"got array of shape {value.shape}.")
+                networks = np.searchsorted(self.roots, np.flatnonzero(mask))
+                values[mask] = value[networks]
+            else:
+                values[mask] = value
+
+        missing = np.flatnonzero(np.isnan(values) & (self.kinds <= KIND_C))
+        if len(missing):
+            i = missing[0]
+            label = f"{_TYPES[int(self.kinds[i])].__name__}{self.table[self.subscripts[i]]}"
+            raise ValueError(f"Value not found for element '{label}'.")
+        return values
+
+    def _evaluate_nodes(self, grid: FrequencyGrid, values: np.ndarray, lo: int, hi: int) -> np.ndarray:
+        """Evaluate the impedance of nodes [lo, hi), which must hold whole networks."""
+
+        kinds = np.asarray(self.kinds[lo:hi])
+        levels = self._node_levels()[lo:hi]
+        trailing = (1,) * len(grid.shape)
+        zz = np.empty((hi - lo,) + grid.shape, dtype=grid.dtype)
+
+        for kind in (KIND_R, KIND_L, KIND_C):
+            nodes = np.flatnonzero(kinds == kind)
+            v = values[nodes + lo].astype(grid.real_dtype).reshape((-1,) + trailing)
+            if kind == KIND_R:
+                zz[nodes] = v
+            elif kind == KIND_L:
+                zz[nodes] = grid.s * v
+            else:
+                zz[nodes] = grid.inv_s / v
+
+        # children precede their parents, so each level of composites is complete once the levels below are
+        for level in range(1, int(levels.max(initial=0)) + 1):
+            for kind in (KIND_SERIES, KIND_PARALLEL):
+                nodes = np.flatnonzero((levels == level) & (kinds == kind))
+                if not len(nodes):
+                    continue
+                starts = self.offsets[nodes + lo]
+                counts = self.offsets[nodes + lo + 1] - starts
+                segments = np.cumsum(counts) - counts
+                children = self.children[np.repeat(starts - segments, counts) + np.arange(counts.sum())] - lo
+                if kind == KIND_SERIES:
+                    zz[nodes] = np.add.reduceat(zz[children], segments, axis=0)
+                else:
+                    zz[nodes] = 1 / np.add.reduceat(1 / zz[children], segments, axis=0)
+        return zz
+
+    def _node_levels(self) -> np.ndarray:
+        """Return the height of each node above the leaves below it (0 for elements), computed once."""
+
+        if self._levels is None:
+            levels = np.zeros(len(self.kinds), dtype=np.int32)
+            composites = np.flatnonzero(np.diff(self.offsets))
+            if len(composites):
+                # one pass per tree level; leaves have no children, so the composites' segments are contiguous
+                starts = self.offsets[composites]
+                while True:
+                    updated = levels.copy()
+                    updated[composites] = 1 + np.maximum.reduceat(levels[self.children], starts)
+                    if np.array_equal(updated, levels):
+                        break
+                    levels = updated
+            self._levels = levels
+        return self._levels
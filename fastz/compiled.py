@@ -0,0 +1,1027 @@
+"""
+Compiled evaluation plans for impedance trees.
+
+.. moduleauthor:: whileman133
+
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union, List, Dict, Iterable, Iterator, Tuple
+import threading
+import numpy as np
+
+from .core import FrequencyGrid, Z, R, L, C, SeriesZ, ParallelZ, LumpedElement, CompositeZ
+
+# plan opcodes
+OP_R = 0
+OP_L = 1
+OP_C = 2
+OP_SERIES = 3
+OP_PARALLEL = 4
+OP_STORE = 5
+OP_LOAD = 6
+
+_LEAF_OPCODES = {R: OP_R, L: OP_L, C: OP_C}
+_COMPOSITE_OPCODES = {SeriesZ: OP_SERIES, ParallelZ: OP_PARALLEL}
+
+# evaluation backends, see CompiledZ.__call__
+BACKENDS = ('numpy', 'numba')
+
+# target size of the registers for one chunk of a multithreaded evaluation, small enough to stay in a core's L2 cache
+CHUNK_BYTES = 1 << 20
+
+
+class CompiledZ:
+    """
+    Flat, non-recursive evaluation plan for an impedance tree.
+
+    The tree is walked once on construction and flattened into a post-order instruction list. Leaf instructions
+    refer to slots in a value table rather than to element objects, and each element label is bound to the slots
+    it controls, so evaluating the plan involves no recursion, no keyword-argument unpacking, and no label lookups
+    per leaf.
+
+    Each instruction writes its result into a register, the position the result would occupy on an evaluation
+    stack. Registers are rows of a scratch arena sized for the deepest point of the tree and reused across calls
+    with the same grid size, and composites reduce their children in place, so evaluation into a caller-owned
+    output buffer over a :class:`FrequencyGrid` allocates no new arrays; a plain frequency array is converted to a
+    new grid, with its Laplace-variable arrays, on every call. Each thread has its own arena, so a plan may be
+    evaluated from several threads at once.
+
+    Sub-trees that occur more than once, whether as the same object or as structurally identical copies (same
+    element types, labels, and values, connected the same way), are evaluated once per call: the first occurrence
+    is stored in a dedicated register and later occurrences load it.
+
+    Registers hold either an impedance or an admittance, whichever is cheaper: series connections sum impedances
+    and parallel connections sum admittances, elements are computed directly in the form their parent sums
+    (Y = sC, Y = 1/(sL), and the reciprocal of a resistance once as a scalar), and a composite's result is
+    inverted only where it feeds a connection of the other kind. A parallel connection of capacitors thus takes no
+    divisions at all, rather than two per capacitor, and short circuits (R = 0) and open circuits (capacitors at
+    f = 0), whether of single elements or of whole composites, evaluate to 0 and infinite impedance without
+    divide-by-zero warnings.
+
+    .. note::
+
+        The plan is a snapshot of the tree at the time of compilation. Recompile after modifying the tree.
+    """
+
+    def __init__(self, z: Z):
+        """
+        Compile an impedance tree into an evaluation plan.
+
+        :param Z z: The impedance tree to compile.
+        :raises TypeError: when the tree contains an impedance type the plan cannot represent.
+        """
+
+        self._label = z.label
+        self._program = []  # type: List[tuple]
+        self._labels = []  # type: List[str]
+        self._defaults = []  # type: List[float]
+        self._slots = {}  # type: Dict[str, List[int]]
+        self._local = threading.local()
+        self._encoded = None
+
+        keys = _structural_keys(z)
+        repeats = _repeated_keys(z, keys)
+
+        # iterative post-order walk so that deep trees do not exhaust the recursion limit
+        depth = 0
+        self._depth = 0
+        stored = {}  # structural key -> index of repeated sub-trees, in order of evaluation
+        stack = [(z, False)]
+        while stack:
+            node, expanded = stack.pop()
+            key = keys[id(node)]
+            if key in stored:
+                self._program.append((OP_LOAD, key, depth))
+                depth += 1
+            elif isinstance(node, LumpedElement):
+                self._program.append((self._leaf_opcode(node), self._bind(node), depth))
+                depth += 1
+            elif expanded:
+                n = len(_as_composite(node)._children)
+                depth -= n
+                self._program.append((self._composite_opcode(node), n, depth))
+                depth += 1
+                if key in repeats:
+                    # the register is assigned below, once the depth of the stack is known
+                    stored[key] = len(stored)
+                    self._program.append((OP_STORE, key, depth - 1))
+            else:
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(_as_composite(node)._children))
+            self._depth = max(self._depth, depth)
+
+        # registers for repeated sub-trees follow the stack registers
+        self._program = [(op, self._depth + stored[arg], dest) if op in (OP_STORE, OP_LOAD) else (op, arg, dest)
+                         for op, arg, dest in self._program]
+        self._nregisters = self._depth + len(stored)
+        self._schedule()
+
+    @property
+    def label(self) -> str:
+        """Label of the impedance from which this plan was compiled."""
+        return self._label
+
+    @property
+    def labels(self) -> List[str]:
+        """Unique labels of the lumped elements in the plan, in order of first appearance."""
+        return list(self._slots)
+
+    @property
+    def depth(self) -> int:
+        """Number of registers needed to evaluate the plan, i.e. the maximum depth of the evaluation stack."""
+        return self._depth
+
+    @property
+    def shared(self) -> int:
+        """Number of repeated sub-trees evaluated once and reused within each evaluation of the plan."""
+        return self._nregisters - self._depth
+
+    def __len__(self):
+        return len(self._program)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self._label}: {len(self._program)} instructions, " \
+               f"{len(self._defaults)} leaves>"
+
+    def __call__(self, ff: Union[FrequencyGrid, np.ndarray, float], out: np.ndarray = None, threads: int = None,
+                 chunk: int = None, backend: str = 'numpy', dtype=None, **lumpedparam):
+        """
+        Evaluate the plan at a frequency or set of frequencies.
+
+        :param ff: The cyclic frequency or frequencies (in Hz) at which to evaluate the impedance, float or 1D numpy array.
+            Pass a :class:`FrequencyGrid` to reuse the Laplace-variable arrays across calls.
+        :param out: (optional) Complex array in which to store the result, with the shape of the frequencies or, when
+            array-valued parameters are supplied, the broadcast shape of the parameters and frequencies.
+        :param int threads: (optional) Number of threads among which to split the frequencies. Frequencies are
+            evaluated in chunks, each small enough for its intermediate arrays to stay in cache.
+        :param int chunk: (optional) Number of frequencies per chunk for multithreaded evaluation. By default chunks
+            are sized so that one chunk's registers take about :data:`CHUNK_BYTES`.
+        :param str backend: 'numpy' to run each instruction over the whole frequency array, or 'numba' to run the
+            whole program in one just-in-time compiled loop over the frequencies, creating no intermediate arrays.
+            Falls back to 'numpy' if numba is not installed.
+        :param dtype: (optional) Complex dtype of the evaluation, complex128 or complex64 for single precision.
+            Defaults to the dtype of the `out` array or of a :class:`FrequencyGrid` when one is supplied, otherwise
+            to complex128.
+        :param lumpedparam: Dictionary of parameter values to associate with lumped elements, as for :meth:`Z.__call__`.
+            Array values sweep the element, with the frequency axis appended to the array's axes.
+        :return: The complex impedance (in Ohms) at the specified frequency/frequencies, scalar or numpy array.
+            The `out` array is returned when supplied.
+        :raises ValueError: when a lumped element has no value, the output array has the wrong shape or type, or
+            the backend is unknown.
+        """
+
+        if backend not in BACKENDS:
+            raise ValueError(f"Expected one of the backends {', '.join(BACKENDS)}, got '{backend}'.")
+
+        if dtype is None and out is not None and np.iscomplexobj(out):
+            dtype = out.dtype
+        grid = FrequencyGrid.of(ff, dtype)
+        values = self._resolve(grid, lumpedparam)
+        shape = _broadcast_shape(grid.shape, *(np.shape(v) for v in values if np.ndim(v)))
+
+        if out is None:
+            result = np.empty(shape, dtype=grid.dtype)
+        elif out.shape != shape or out.dtype != grid.dtype:
+            raise ValueError(f"Expected a {grid.dtype} output array of shape {shape}, "
+                             f"got {out.dtype} array of shape {out.shape}.")
+        else:
+            result = out
+
+        if threads and grid.shape:
+            self._run_threaded(grid, values, result, threads, chunk, backend, frozenset(lumpedparam))
+        else:
+            self._run(grid, values, result, backend, frozenset(lumpedparam))
+
+        if out is None and not shape:
+            return result[()]
+        return result
+
+    def magnitude(self, ff: Union[FrequencyGrid, np.ndarray, float], out: np.ndarray = None, chunk: int = None,
+                  dtype=None, **lumpedparam):
+        """
+        Evaluate the impedance magnitude |Z| of the plan, without holding the complex impedance in memory.
+
+        Frequencies are evaluated in chunks into a small complex scratch array, whose magnitude is written straight
+        into the real result, so the memory and traffic of the full complex array and of a separate `abs` pass are
+        saved.
+
+        :param ff: The cyclic frequency or frequencies (in Hz) at which to evaluate the impedance, float or 1D numpy array.
+        :param out: (optional) Real array in which to store the result, of the shape of the impedance and the real
+            dtype of its precision (float64, or float32 in single precision).
+        :param int chunk: (optional) Number of frequencies per chunk. By default chunks are sized so that one chunk's
+            registers take about :data:`CHUNK_BYTES`.
+        :param dtype: (optional) Complex dtype of the evaluation, complex128 or complex64. Defaults to the precision
+            of the `out` array or of a :class:`FrequencyGrid` when one is supplied, otherwise to complex128.
+        :param lumpedparam: Dictionary of parameter values to associate with lumped elements, as for :meth:`Z.__call__`.
+        :return: The impedance magnitude (in Ohms), scalar or numpy array. The `out` array is returned when supplied.
+        :raises ValueError: when a lumped element has no value or the output array has the wrong shape or type.
+        """
+
+        if dtype is None and out is not None and out.dtype.kind == 'f':
+            dtype = np.result_type(out.dtype, np.complex64)
+        grid = FrequencyGrid.of(ff, dtype)
+        values = self._resolve(grid, lumpedparam)
+        shape = _broadcast_shape(grid.shape, *(np.shape(v) for v in values if np.ndim(v)))
+        overridden = frozenset(lumpedparam)
+
+        if out is None:
+            result = np.empty(shape, dtype=grid.real_dtype)
+        elif out.shape != shape or out.dtype != grid.real_dtype:
+            raise ValueError(f"Expected a {grid.real_dtype} output array of shape {shape}, "
+                             f"got {out.dtype} array of shape {out.shape}.")
+        else:
+            result = out
+
+        if not grid.shape:
+            z = np.empty(shape, dtype=grid.dtype)
+            self._run(grid, values, z, overridden=overridden)
+            np.abs(z, out=result)
+        else:
+            n = grid.shape[-1]
+            if chunk is None:
+                per_freq = self._nregisters * max(1, result.size // max(n, 1)) * grid.dtype.itemsize
+                chunk = max(4096, CHUNK_BYTES // per_freq)
+            chunk = min(chunk, n) or 1
+            scratch = np.empty(shape[:-1] + (chunk,), dtype=grid.dtype)
+            for start in range(0, n, chunk):
+                stop = min(start + chunk, n)
+                z = scratch[..., :stop - start]
+                self._run(grid[start:stop], values, z, overridden=overridden)
+                np.abs(z, out=result[..., start:stop])
+
+        if out is None and not shape:
+            return result[()]
+        return result
+
+    def eval_with_sensitivities(self, ff: Union[FrequencyGrid, np.ndarray, float], wrt: Union[str, Iterable[str]],
+                                dtype=None, **lumpedparam) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """
+        Evaluate the plan together with the derivatives of the impedance with respect to element values.
+
+        Derivatives are propagated forward through the program alongside the impedance: dZ/dR = 1, dZ/dL = s, and
+        dZ/dC = -Z/C at the leaves, the sum of the children's derivatives through series connections, and
+        Z² Σ (dZi / Zi²) through parallel connections. All derivatives are obtained in the one pass, rather than
+        the two evaluations per parameter of finite differences.
+
+        :param ff: The cyclic frequency or frequencies (in Hz) at which to evaluate the impedance, float or 1D numpy array.
+        :param wrt: Labels of the elements with respect to whose values to differentiate, as a list or a
+            whitespace-separated string. An element label shared by several elements differentiates with respect to
+            their common value.
+        :param dtype: (optional) Complex dtype of the evaluation, complex128 (the default) or complex64.
+        :param lumpedparam: Dictionary of parameter values to associate with lumped elements, as for :meth:`Z.__call__`.
+        :return tuple: The complex impedance (in Ohms), and a dictionary of its derivatives (in Ohms per unit of
+            element value) keyed by label, each of the shape of the impedance.
+        :raises KeyError: when a label does not name an element of the plan.
+        :raises ValueError: when a lumped element has no value.
+        """
+
+        if isinstance(wrt, str):
+            wrt = wrt.split()
+        wrt = list(dict.fromkeys(wrt))
+        for label in wrt:
+            if label not in self._slots:
+                raise KeyError(f"Could not locate lumped element with the label '{label}' within '{self._label}'.")
+        rows = {index: k for k, label in enumerate(wrt) for index in self._slots[label]}
+
+        grid = FrequencyGrid.of(ff, dtype)
+        values = self._resolve(grid, lumpedparam)
+        shape = _broadcast_shape(grid.shape, *(np.shape(v) for v in values if np.ndim(v)))
+
+        # tangents are (n_wrt,) + shape arrays; None stands for a sub-tree that depends on none of the parameters
+        zz = [None] * self._nregisters
+        tt = [None] * self._nregisters
+        for op, arg, dest in self._program:
+            if op in (OP_R, OP_L, OP_C):
+                v = values[arg]
+                if op == OP_R:
+                    z = np.ones(grid.shape, dtype=grid.real_dtype) * v
+                    dz = np.ones_like(z)
+                elif op == OP_L:
+                    z = grid.s * v
+                    dz = grid.s
+                else:
+                    z = grid.inv_s / v
+                    dz = -z / v
+                zz[dest] = z
+                tt[dest] = None
+                if arg in rows:
+                    t = tt[dest] = np.zeros((len(wrt),) + shape, dtype=grid.dtype)
+                    t[rows[arg]] = dz
+            elif op == OP_SERIES:
+                zz[dest] = sum(zz[dest:dest + arg])
+                tt[dest] = _sum(tt[dest:dest + arg])
+            elif op == OP_PARALLEL:
+                z = 1 / sum(1 / z for z in zz[dest:dest + arg])
+                t = _sum([None if t is None else t / zi ** 2 for zi, t in zip(zz[dest:dest + arg], tt[dest:dest + arg])])
+                zz[dest] = z
+                tt[dest] = None if t is None else t * z ** 2
+            elif op == OP_STORE:
+                zz[arg], tt[arg] = zz[dest], tt[dest]
+            else:
+                zz[dest], tt[dest] = zz[arg], tt[arg]
+
+        z = np.broadcast_to(zz[0], shape).astype(grid.dtype)
+        t = tt[0] if tt[0] is not None else np.zeros((len(wrt),) + shape, dtype=grid.dtype)
+        t = np.broadcast_to(t, (len(wrt),) + shape).astype(grid.dtype)
+        return z[()], {label: t[k][()] for k, label in enumerate(wrt)}
+
+    def gradient(self, ff: Union[FrequencyGrid, np.ndarray, float], target, weights=None,
+                 **lumpedparam) -> Tuple[float, Dict[str, np.ndarray]]:
+        """
+        Evaluate the weighted squared error of the impedance magnitude against a target, and its gradient with respect
+        to the values of all elements, e.g. for fitting a model to a measured impedance.
+
+        The objective is Σ w·(|Z| - target)² over the frequencies (and any parameter-sweep axes). Its gradient is
+        computed in reverse mode by :meth:`backward`, at the cost of about two evaluations however many elements the
+        plan has.
+
+        :param ff: The cyclic frequency or frequencies (in Hz) at which to evaluate the impedance, float or 1D numpy array.
+        :param target: Target impedance magnitude (in Ohms), broadcast against the impedance.
+        :param weights: (optional) Weight of each frequency, broadcast against the impedance. Defaults to one.
+        :param lumpedparam: Dictionary of parameter values to associate with lumped elements, as for :meth:`Z.__call__`.
+        :return tuple: The value of the objective, and a dictionary of its gradient keyed by element label.
+        :raises ValueError: when a lumped element has no value.
+        """
+
+        weights = 1.0 if weights is None else weights
+        memo = {}
+        z = self._forward(FrequencyGrid.of(ff), lumpedparam, memo)
+        mag = np.abs(z)
+        error = mag - target
+        # cotangent of the objective: 2w(|Z| - target) ∂|Z|/∂Z*, where ∂|Z| = Re(conj(Z/|Z|) dZ)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            direction = np.where(mag > 0, z / mag, 0)
+        loss = float(np.sum(weights * error ** 2))
+        return loss, self._backward(memo, np.broadcast_to(2 * weights * error * direction, np.shape(z)))
+
+    def backward(self, ff: Union[FrequencyGrid, np.ndarray, float], cotangent,
+                 **lumpedparam) -> Dict[str, np.ndarray]:
+        """
+        Compute the gradient of a real-valued function of the impedance with respect to the values of all elements,
+        by reverse-mode (adjoint) differentiation through the plan.
+
+        The impedance is evaluated once, keeping the impedance of every instruction, and the cotangent is then
+        propagated from the root to the leaves: unchanged through series connections, scaled by conj(Z² / Zi²)
+        through parallel connections, and accumulated on sub-trees that occur more than once. The cost is about two
+        evaluations, independent of the number of elements.
+
+        :param ff: The cyclic frequency or frequencies (in Hz) at which to evaluate the impedance, float or 1D numpy array.
+        :param cotangent: ∂f/∂Re(Z) + j ∂f/∂Im(Z), the derivative of the function f with respect to the impedance,
+            complex array broadcast against the impedance.
+        :param lumpedparam: Dictionary of parameter values to associate with lumped elements, as for :meth:`Z.__call__`.
+        :return dict: The gradient ∂f/∂p keyed by element label; a float for scalar values, or an array of the shape
+            of an array-valued parameter.
+        :raises ValueError: when a lumped element has no value.
+        """
+
+        memo = {}
+        z = self._forward(FrequencyGrid.of(ff), lumpedparam, memo)
+        return self._backward(memo, np.broadcast_to(cotangent, np.shape(z)))
+
+    def _forward(self, grid: FrequencyGrid, lumpedparam: dict, memo: dict):
+        """
+        Evaluate the program, recording in memo what the reverse pass needs: the impedance of each instruction, the
+        instructions producing each composite's children, and the value table.
+        """
+
+        values = self._resolve(grid, lumpedparam)
+        zz = [None] * len(self._program)
+        children = {}
+        producer = [None] * self._nregisters  # instruction whose result occupies each register
+        for i, (op, arg, dest) in enumerate(self._program):
+            if op == OP_R:
+                zz[i] = np.ones(grid.shape, dtype=grid.real_dtype) * values[arg]
+            elif op == OP_L:
+                zz[i] = grid.s * values[arg]
+            elif op == OP_C:
+                zz[i] = grid.inv_s / values[arg]
+            elif op == OP_SERIES:
+                children[i] = producer[dest:dest + arg]
+                zz[i] = sum(zz[j] for j in children[i])
+            elif op == OP_PARALLEL:
+                children[i] = producer[dest:dest + arg]
+                zz[i] = 1 / sum(1 / zz[j] for j in children[i])
+            elif op == OP_STORE:
+                producer[arg] = producer[dest]
+                continue
+            else:
+                producer[dest] = producer[arg]
+                continue
+            producer[dest] = i
+
+        # gradients take the shape of each label's value, the override or else the defaults of its elements
+        shapes = {label: np.shape(lumpedparam[label]) if label in lumpedparam
+                  else _broadcast_shape(*(np.shape(self._defaults[i]) for i in slots))
+                  for label, slots in self._slots.items()}
+        memo.update(zz=zz, children=children, values=values, root=producer[0], grid=grid, shapes=shapes)
+        return zz[producer[0]]
+
+    def _backward(self, memo: dict, cotangent: np.ndarray) -> Dict[str, np.ndarray]:
+        """Propagate a cotangent from the root of a recorded forward pass to the element values."""
+
+        zz, children, values, grid = memo['zz'], memo['children'], memo['values'], memo['grid']
+        adjoints = {memo['root']: cotangent}
+        gradient = {label: 0.0 for label in self._slots}
+
+        # instructions are in post-order, so every node's adjoint is complete before it is visited in reverse
+        for i in reversed(range(len(self._program))):
+            g = adjoints.pop(i, None)
+            if g is None:
+                continue
+            op, arg, _ = self._program[i]
+            if op == OP_SERIES:
+                for j in children[i]:
+                    adjoints[j] = adjoints[j] + g if j in adjoints else g
+            elif op == OP_PARALLEL:
+                for j in children[i]:
+                    gj = g * np.conj((zz[i] / zz[j]) ** 2)
+                    adjoints[j] = adjoints[j] + gj if j in adjoints else gj
+            else:
+                v = values[arg]
+                dz = 1.0 if op == OP_R else grid.s if op == OP_L else -zz[i] / v
+                label = self._labels[arg]
+                gradient[label] = gradient[label] + _unbroadcast(np.real(np.conj(g) * dz), np.shape(v))
+
+        return {label: np.reshape(g, memo['shapes'][label])[()] for label, g in gradient.items()}
+
+    def codegen(self, *free: str):
+        """
+        Generate and compile a flat Python function evaluating the plan, e.g.
+        ``def f(s, Rload=1.0, Cesr=0.005): t0 = ...; return ...``.
+
+        The function takes the Laplace variable s = j2πf (scalar or numpy array) and the values of the free elements.
+        Values of all other elements are inlined as constants, and the function performs no method dispatch or label
+        lookups, which makes it the cheapest way to evaluate small networks at a few frequencies. Repeated sub-trees
+        are computed once.
+
+        The function uses plain arithmetic, so at f = 0 (s = 0) a capacitor's impedance 1/(sC) raises
+        :class:`ZeroDivisionError` for a scalar s, and is infinite with a numpy divide-by-zero warning for an array.
+
+        :param free: Labels of the elements whose values become arguments of the function, defaulting to the values
+            loaded on construction of the elements. Elements without a scalar value, either with no value or with an
+            array value, are always free, and their arguments, which have no default, come first.
+        :return: The compiled function. Its source code is available as the function's `source` attribute.
+        :raises KeyError: when a free label does not name an element of the plan.
+        :raises ValueError: when a free label is not a valid Python identifier.
+        """
+
+        for label in free:
+            if label not in self._slots:
+                raise KeyError(f"Could not locate lumped element with the label '{label}' within '{self._label}'.")
+        def inlined(i):
+            return self._defaults[i] is not None and np.ndim(self._defaults[i]) == 0
+
+        free = list(free) + [label for label in self._slots if label not in free
+                             and not all(inlined(i) for i in self._slots[label])]
+        for label in free:
+            if not label.isidentifier() or label == 's':
+                raise ValueError(f"Label '{label}' cannot be used as a function argument.")
+
+        def value(arg):
+            label = self._labels[arg]
+            return label if label in free else repr(float(self._defaults[arg]))
+
+        # with no inductors or capacitors, the impedance must still be broadcast to the shape of s
+        reactive = any(op in (OP_L, OP_C) for op, _, _ in self._program)
+
+        lines = []
+        stack = []
+        stored = {}
+        for op, arg, _ in self._program:
+            if op == OP_R:
+                stack.append(value(arg))
+            elif op == OP_L:
+                stack.append(f"s * {value(arg)}")
+            elif op == OP_C:
+                stack.append(f"1 / (s * {value(arg)})")
+            elif op == OP_STORE:
+                stored[arg] = stack[-1]
+            elif op == OP_LOAD:
+                stack.append(stored[arg])
+            else:
+                children = stack[-arg:]
+                del stack[-arg:]
+                if op == OP_SERIES:
+                    expr = " + ".join(children)
+                else:
+                    expr = "1 / (" + " + ".join(f"1 / ({z})" for z in children) + ")"
+                name = f"t{len(lines)}"
+                lines.append(f"    {name} = {expr}")
+                stack.append(name)
+        result = stack[0] if reactive else f"{stack[0]} + 0 * s"
+
+        # arguments without a default value come first
+        required, optional = [], []
+        for label in free:
+            slots = self._slots[label]
+            defaults = {float(self._defaults[i]) for i in slots} if all(inlined(i) for i in slots) else ()
+            default = defaults.pop() if len(defaults) == 1 else None
+            if default is None:
+                required.append(label)
+            else:
+                optional.append(f"{label}={float(default)!r}")
+        params = required + optional
+
+        source = "\n".join([f"def f({', '.join(['s'] + params)}):"] + lines + [f"    return {result}"]) + "\n"
+        namespace = {}
+        exec(compile(source, f"<codegen {self._label}>", 'exec'), namespace)
+        f = namespace['f']
+        f.source = source
+        return f
+
+    def iter_eval(self, ff_source, chunk: int = 65536, threads: int = None, dtype=None,
+                  **lumpedparam) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Evaluate the plan chunk by chunk over a stream of frequencies.
+
+        Neither the full frequency grid nor the full result is ever held in memory, and each chunk is yielded as soon
+        as it is evaluated.
+
+        :param ff_source: The frequencies (in Hz), one of:
+
+            - a range specification tuple (start, stop, points) or (start, stop, points, 'lin' | 'log'), spaced
+              linearly by default or geometrically from start to stop with 'log'. A plain tuple is always read as
+              a range specification; pass a list or array to give the frequencies themselves;
+            - a numpy array or memmap, read one slice at a time;
+            - any other iterable of frequencies or arrays of frequencies, e.g. a generator.
+
+        :param int chunk: The number of frequencies per chunk.
+        :param int threads: (optional) Number of threads among which to split each chunk.
+        :param dtype: (optional) Complex dtype of the evaluation, complex128 (the default) or complex64.
+        :param lumpedparam: Dictionary of parameter values to associate with lumped elements, as for :meth:`Z.__call__`.
+        :return: Iterator over (ff_chunk, z_chunk) pairs of frequency and impedance arrays.
+        :raises ValueError: when a range specification is malformed.
+        """
+
+        for ff in frequency_chunks(ff_source, chunk):
+            yield ff, self(ff, threads=threads, dtype=dtype, **lumpedparam)
+
+    def _run(self, grid: FrequencyGrid, values: list, result: np.ndarray, backend: str = 'numpy',
+             overridden: frozenset = frozenset()):
+        """
+        Execute the program over a frequency grid, storing the root impedance in the result array.
+
+        :param overridden: Labels of the elements whose values differ from their defaults in this evaluation.
+        """
+
+        if backend == 'numba' and _jit.kernel is not None:
+            if self._encoded is None:
+                self._encoded = _jit.encode(self._program)
+            _jit.run(_jit.kernel, self._encoded, self._nregisters, grid, values, result)
+            return
+
+        # register 0 receives the root of the tree, so it is the output array itself
+        registers = self._registers(result.shape, result.dtype)
+        registers[0] = result
+        # frequency-independent results, held as impedances (scalars, or parameter-shaped arrays in sweeps)
+        consts = [None] * self._nregisters
+
+        # infinite impedances and admittances are the open and short circuits of the network
+        with np.errstate(divide='ignore'):
+            i = 0
+            while i < len(self._program):
+                op, arg, dest = self._program[i]
+                if self._constant[i]:
+                    block = self._blocks.get(i)
+                    if block is not None and block[1].isdisjoint(overridden):
+                        # a frequency-independent sub-tree folded on compilation; skip its instructions
+                        i, _, consts[dest], stores = block
+                        for reg, value in stores:
+                            consts[reg] = value
+                        continue
+                    _run_constant(op, arg, dest, values, consts)
+                    i += 1
+                    continue
+
+                reg = registers[dest]
+                admittance = self._forms[i]
+                if op == OP_L or op == OP_C:
+                    # reactances are imaginary; computing only the imaginary part halves the work and keeps the
+                    # infinities of open circuits free of the nans of complex arithmetic
+                    reg.real[...] = 0
+                    if (op == OP_L) != admittance:
+                        np.multiply(grid.s.imag, values[arg], out=reg.imag)  # sL or sC
+                    else:
+                        np.divide(grid.inv_s.imag, values[arg], out=reg.imag)  # 1/(sC) or 1/(sL)
+                elif op == OP_STORE:
+                    np.copyto(registers[arg], reg)
+                elif op == OP_LOAD:
+                    np.copyto(reg, registers[arg])
+                else:
+                    # series connections sum impedances and parallel connections admittances
+                    for r in self._flips[i]:
+                        _invert(registers[r])
+                    arrays, scalars = self._operands[i]
+                    if arrays[0] != dest:
+                        np.copyto(reg, registers[arrays[0]])
+                    for r in arrays[1:]:
+                        np.add(reg, registers[r], out=reg)
+                    if scalars:
+                        # constants are broadcast only here, where they meet frequency-dependent results
+                        np.add(reg, sum(np.divide(1.0, consts[r]) if admittance else consts[r] for r in scalars),
+                               out=reg)
+                i += 1
+
+            if self._constant[self._root]:
+                result[...] = consts[0]
+            elif self._forms[self._root]:
+                _invert(result)
+
+    def _run_threaded(self, grid: FrequencyGrid, values: list, result: np.ndarray, threads: int, chunk: int = None,
+                      backend: str = 'numpy', overridden: frozenset = frozenset()):
+        """Execute the program over chunks of the frequency axis on a thread pool, writing into one result array."""
+
+        n = grid.shape[-1]
+        if chunk is None:
+            # registers per frequency: the arena plus the output, times any parameter-sweep axes
+            per_freq = self._nregisters * result.size // n * result.itemsize
+            chunk = max(4096, CHUNK_BYTES // per_freq)
+
+        def run_chunk(start):
+            stop = min(start + chunk, n)
+            self._run(grid[start:stop], values, result[..., start:stop], backend, overridden)
+
+        with ThreadPoolExecutor(threads) as pool:
+            # consume the iterator so that exceptions raised in worker threads propagate
+            list(pool.map(run_chunk, range(0, n, chunk)))
+
+    def _registers(self, shape: tuple, dtype: np.dtype = np.dtype(complex)) -> list:
+        """
+        Return the register list for evaluating over frequencies of the given shape and dtype.
+
+        Registers other than the output register are rows of a per-thread scratch arena that is kept between calls
+        and reallocated only when the shape of the frequencies or the dtype changes.
+        """
+
+        cached = getattr(self._local, 'arena', None)
+        if cached is None or cached[0] != (shape, dtype):
+            arena = np.empty((self._nregisters - 1,) + shape, dtype=dtype)
+            # index with an ellipsis so that rows are views even for scalar frequencies (0-d rows)
+            cached = self._local.arena = ((shape, dtype), [None] + [arena[i, ...] for i in range(len(arena))])
+        return cached[1]
+
+    def _schedule(self):
+        """
+        Annotate the program for evaluation by :meth:`_run`.
+
+        Instructions whose results do not depend on frequency, those of resistors and of sub-trees made only of
+        resistors, are marked constant; they are evaluated as scalars rather than arrays. Each largest constant
+        sub-tree is folded into its value for the default element values, so that its instructions are skipped
+        unless one of its elements is given another value.
+
+        Every other result is held as an impedance or an admittance: composites hold the form they sum, admittance
+        for parallel connections, and inductors and capacitors are computed in the form their parent sums.
+        For each composite, the registers it inverts before summing and its array and constant operands are noted.
+        """
+
+        n = len(self._program)
+        self._constant = [False] * n
+        self._forms = [False] * n
+        self._flips = [()] * n
+        self._operands = [None] * n
+        blocks = []  # (start, stop, labels) of the largest constant sub-trees
+
+        producer = [None] * self._nregisters  # instruction whose result occupies each register
+        start = [None] * self._nregisters  # first instruction of the sub-tree in each register
+        form = [None] * self._nregisters  # form of each register, None for elements, which take any form
+        labels = [None] * self._nregisters  # labels within constant sub-trees
+
+        for i, (op, arg, dest) in enumerate(self._program):
+            if op == OP_STORE:
+                self._constant[i] = labels[dest] is not None
+                self._forms[i] = form[dest]
+                form[arg], labels[arg] = form[dest], labels[dest]
+                continue
+
+            if op == OP_R:
+                labels[dest] = frozenset([self._labels[arg]])
+                form[dest] = None
+            elif op in (OP_L, OP_C):
+                labels[dest] = form[dest] = None
+            elif op == OP_LOAD:
+                form[dest], labels[dest] = form[arg], labels[arg]
+                self._forms[i] = bool(form[arg])
+            elif all(labels[r] is not None for r in range(dest, dest + arg)):
+                labels[dest] = frozenset().union(*labels[dest:dest + arg])
+                form[dest] = None
+            else:
+                admittance = op == OP_PARALLEL
+                flips, arrays, scalars = [], [], []
+                for r in range(dest, dest + arg):
+                    if labels[r] is not None:
+                        scalars.append(r)
+                        blocks.append((start[r], producer[r] + 1, labels[r]))
+                    else:
+                        arrays.append(r)
+                        if form[r] is None:
+                            self._forms[producer[r]] = admittance
+                        elif form[r] != admittance:
+                            flips.append(r)
+                self._forms[i] = admittance
+                self._flips[i] = tuple(flips)
+                self._operands[i] = (tuple(arrays), tuple(scalars))
+                labels[dest] = None
+                form[dest] = admittance
+
+            if op != OP_SERIES and op != OP_PARALLEL:
+                start[dest] = i
+            self._constant[i] = labels[dest] is not None
+            producer[dest] = i
+
+        self._root = producer[0]
+        if self._constant[self._root]:
+            blocks.append((start[0], self._root + 1, labels[0]))
+
+        # fold the constant sub-trees for the default values, in program order so that repeated sub-trees are
+        # stored before they are loaded; None stands for values that are only supplied on evaluation, or that are
+        # arrays, which are shaped for the frequency grid of each evaluation
+        consts = [None] * self._nregisters
+        folded = {}
+        for i, (op, arg, dest) in enumerate(self._program):
+            if not self._constant[i]:
+                continue
+            if op == OP_R:
+                consts[dest] = None if np.ndim(self._defaults[arg]) else self._defaults[arg]
+            elif op in (OP_SERIES, OP_PARALLEL) and any(c is None for c in consts[dest:dest + arg]):
+                consts[dest] = None
+            else:
+                with np.errstate(divide='ignore'):
+                    _run_constant(op, arg, dest, self._defaults, consts)
+            folded[i] = consts[dest] if op != OP_STORE else consts[arg]
+
+        self._blocks = {}
+        for begin, stop, block_labels in blocks:
+            if folded[stop - 1] is None:
+                continue
+            stores = tuple((self._program[j][1], folded[j]) for j in range(begin, stop)
+                           if self._program[j][0] == OP_STORE)
+            self._blocks[begin] = (stop, block_labels, folded[stop - 1], stores)
+
+    def _bind(self, leaf: LumpedElement) -> int:
+        """Allocate a value slot for a leaf and bind the leaf's label to it."""
+
+        index = len(self._defaults)
+        self._labels.append(leaf.label)
+        self._defaults.append(leaf.value)
+        self._slots.setdefault(leaf.label, []).append(index)
+        return index
+
+    def _resolve(self, grid: FrequencyGrid, lumpedparam: dict) -> list:
+        """
+        Build the value table for one evaluation from the default leaf values and the parameter overrides,
+        with array values shaped for broadcasting against the frequency grid.
+
+        :raises ValueError: when a lumped element has no value.
+        """
+
+        # array defaults are shaped for the grid like overrides; scalars are used as they are
+        values = [grid.expand(value) if np.ndim(value) else value for value in self._defaults]
+        for name, value in lumpedparam.items():
+            if name in self._slots:
+                value = grid.expand(value)
+                for index in self._slots[name]:
+                    values[index] = value
+
+        for index, value in enumerate(values):
+            if value is None:
+                raise ValueError(f"Value not found for element '{self._labels[index]}'.")
+
+        return values
+
+    @staticmethod
+    def _leaf_opcode(node: LumpedElement) -> int:
+        try:
+            return _LEAF_OPCODES[type(node)]
+        except KeyError:
+            raise TypeError(f"Cannot compile lumped element of type '{type(node).__name__}'.") from None
+
+    @staticmethod
+    def _composite_opcode(node: CompositeZ) -> int:
+        try:
+            return _COMPOSITE_OPCODES[type(node)]
+        except KeyError:
+            raise TypeError(f"Cannot compile composite impedance of type '{type(node).__name__}'.") from None
+
+
+def _invert(a: np.ndarray):
+    """
+    Invert impedances or admittances in place, mapping zero to infinity and infinity to zero.
+
+    The complex reciprocal of zero or of an infinity is nan, so composite short and open circuits are fixed up
+    explicitly. Finite arrays are checked for zeros by the result alone, so the common case costs one extra pass
+    over the array before and after inverting it and allocates nothing.
+    """
+
+    with np.errstate(over='ignore', invalid='ignore'):
+        finite = np.isfinite(_squares(a))
+    if finite:
+        with np.errstate(over='ignore', invalid='ignore'):
+            np.reciprocal(a, out=a)
+            if not np.isnan(_squares(a)):
+                return
+        # the reciprocals of zeros, the only nans that finite values produce
+        a[np.isnan(a)] = np.inf
+        return
+
+    zero = a == 0
+    infinite = ~np.isfinite(a)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.reciprocal(a, out=a)
+    a[zero] = np.inf
+    a[infinite] = 0
+
+
+def _squares(a: np.ndarray) -> float:
+    """Reduce a complex array to a scalar that is finite when its entries are, and nan when one of them is."""
+
+    if a.flags.c_contiguous:
+        v = a.reshape(-1).view(a.real.dtype)
+        return np.dot(v, v)
+    return np.sum(a)
+
+
+def _run_constant(op: int, arg: int, dest: int, values: list, consts: list):
+    """Execute one instruction of a frequency-independent sub-tree, whose results are held as impedances."""
+
+    if op == OP_R:
+        consts[dest] = values[arg]
+    elif op == OP_SERIES:
+        consts[dest] = sum(consts[dest:dest + arg])
+    elif op == OP_PARALLEL:
+        consts[dest] = np.divide(1.0, sum(np.divide(1.0, c) for c in consts[dest:dest + arg]))
+    elif op == OP_STORE:
+        consts[arg] = consts[dest]
+    else:
+        consts[dest] = consts[arg]
+
+
+def _as_composite(node: Z) -> CompositeZ:
+    """Narrow a non-leaf tree node to a composite impedance."""
+
+    if not isinstance(node, CompositeZ):
+        raise TypeError(f"Cannot compile impedance of type '{type(node).__name__}'.")
+    return node
+
+
+def _structural_keys(z: Z) -> Dict[int, int]:
+    """
+    Number the distinct sub-trees of an impedance tree by structure.
+
+    Sub-trees receive the same key when they are the same object or are structurally identical: leaves of the same
+    type with the same label and value, or composites of the same type over the same multiset of children.
+    Keys are assigned by hash-consing, so the cost is linear in the size of the tree.
+
+    :return dict: Structural key of each node, keyed by node id.
+    """
+
+    keys = {}
+    interned = {}
+    stack = [(z, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if id(node) in keys:
+            continue
+        if isinstance(node, LumpedElement):
+            signature = (type(node), node.label, node.value)
+            try:
+                hash(signature)
+            except TypeError:
+                # unhashable (array) value; only the same object is considered identical
+                signature = (type(node), id(node))
+        elif expanded:
+            # series and parallel connections are commutative, so the order of the children is irrelevant
+            signature = (type(node), tuple(sorted(keys[id(child)] for child in _as_composite(node)._children)))
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in _as_composite(node)._children)
+            continue
+        keys[id(node)] = interned.setdefault(signature, len(interned))
+    return keys
+
+
+def _repeated_keys(z: Z, keys: Dict[int, int]) -> set:
+    """
+    Find the composite sub-trees that occur more than once in an impedance tree.
+
+    Occurrences within a repeated sub-tree are not counted again, so only the outermost repeated sub-trees are
+    reported.
+
+    :return set: Structural keys of the repeated composites.
+    """
+
+    seen = set()
+    repeats = set()
+    stack = [z]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, LumpedElement):
+            continue
+        key = keys[id(node)]
+        if key in seen:
+            repeats.add(key)
+        else:
+            seen.add(key)
+            stack.extend(_as_composite(node)._children)
+    return repeats
+
+
+def frequency_chunks(ff_source, chunk: int) -> Iterator[np.ndarray]:
+    """
+    Split a source of frequencies into arrays of at most chunk frequencies, see :meth:`CompiledZ.iter_eval`.
+
+    :raises ValueError: when a range specification is malformed.
+    """
+
+    if isinstance(ff_source, tuple):
+        if not 3 <= len(ff_source) <= 4:
+            raise ValueError(f"Expected a range specification (start, stop, points[, spacing]), got {ff_source}.")
+        yield from _range_chunks(*ff_source, chunk=chunk)
+    elif isinstance(ff_source, np.ndarray):
+        for start in range(0, len(ff_source), chunk):
+            # np.asarray loads memmap slices into memory
+            yield np.asarray(ff_source[start:start + chunk], dtype=float)
+    else:
+        yield from _iterable_chunks(ff_source, chunk)
+
+
+def _range_chunks(start: float, stop: float, points: int, spacing: str = 'lin', *, chunk: int):
+    """Generate the chunks of a linearly- or geometrically-spaced frequency range."""
+
+    try:
+        count = int(points)
+    except (TypeError, ValueError):
+        count = None
+    if count is None or count != points or count < 1:
+        raise ValueError(f"Expected a positive whole number of range points, got {points!r}.")
+    points = count
+    if spacing not in ('lin', 'log'):
+        raise ValueError(f"Expected range spacing 'lin' or 'log', got '{spacing}'.")
+    if spacing == 'log' and (start <= 0 or stop <= 0):
+        raise ValueError(f"Log-spaced ranges require positive endpoints, got {start} and {stop}.")
+
+    step = 1 / (points - 1) if points > 1 else 0
+    for i in range(0, points, chunk):
+        t = np.arange(i, min(i + chunk, points), dtype=float) * step
+        if spacing == 'lin':
+            yield start + (stop - start) * t
+        else:
+            yield start * (stop / start) ** t
+
+
+def _iterable_chunks(ff_source: Iterable, chunk: int):
+    """Regroup an iterable of frequencies or frequency arrays into chunks."""
+
+    pending = []
+    count = 0
+    for item in ff_source:
+        ff = np.atleast_1d(np.asarray(item, dtype=float))
+        pending.append(ff)
+        count += len(ff)
+        if count >= chunk:
+            ff = np.concatenate(pending)
+            for start in range(0, len(ff) - chunk + 1, chunk):
+                yield ff[start:start + chunk]
+            rest = ff[len(ff) - len(ff) % chunk:]
+            pending = [rest]
+            count = len(rest)
+
+    if count:
+        yield np.concatenate(pending)
+
+
+def _unbroadcast(g: np.ndarray, shape: tuple) -> np.ndarray:
+    """Sum an array over the axes along which an array of the given shape was broadcast to match it."""
+
+    g = np.sum(g, axis=tuple(range(np.ndim(g) - len(shape)))) if np.ndim(g) > len(shape) else g
+    axes = tuple(k for k, n in enumerate(shape) if n == 1 and np.shape(g)[k] != 1)
+    return np.sum(g, axis=axes, keepdims=True) if axes else g
+
+
+def _sum(terms: list):
+    """Sum arrays, treating None as zero; None if every term is None."""
+
+    terms = [t for t in terms if t is not None]
+    return sum(terms[1:], terms[0]) if terms else None
+
+
+def _broadcast_shape(*shapes: tuple) -> tuple:
+    """
+    Compute the shape resulting from broadcasting arrays of the given shapes together.
+
+    :raises ValueError: when the shapes cannot be broadcast together.
+    """
+
+    ndim = max(len(shape) for shape in shapes)
+    result = []
+    for dims in zip(*((1,) * (ndim - len(shape)) + tuple(shape) for shape in shapes)):
+        sizes = set(dims) - {1}
+        if len(sizes) > 1:
+            raise ValueError(f"Parameter arrays with shapes {', '.join(str(s) for s in shapes)} "
+                             f"cannot be broadcast together.")
+        result.append(sizes.pop() if sizes else 1)
+    return tuple(result)
+
+
+# imported last; the kernel module depends on the opcodes defined above
+from . import _jit  # noqa: E402
@@ -11,9 +11,162 @@ import math
 import numpy as np
 
 
+class FrequencyGrid:
+    """
+    Set of frequencies at which to evaluate impedances, with cached Laplace-variable arrays.
+
+    Passing a FrequencyGrid in place of a frequency array lets every element of an impedance tree share one
+    computation of the Laplace variable s = j2πf and its reciprocal, instead of each inductor and capacitor
+    recomputing them. A grid is accepted wherever a frequency or frequency array is accepted.
+
+    The grid also sets the precision of evaluation. Impedances evaluated over a single-precision (complex64) grid are
+    computed and returned in single precision throughout, halving memory use and traffic at the cost of accuracy.
+    """
+
+    def __init__(self, ff: Union[np.ndarray, float], dtype=None):
+        """
+        Initialize a frequency grid.
+
+        :param ff: The cyclic frequency or frequencies (in Hz) of the grid, float or 1D numpy array.
+        :param dtype: (optional) Complex dtype of evaluations over the grid, complex128 (the default) or complex64.
+        :raises ValueError: when the dtype is not a complex floating-point type.
+        """
+
+        dtype = np.dtype(complex if dtype is None else dtype)
+        if dtype.kind != 'c':
+            raise ValueError(f"Expected a complex dtype, got {dtype}.")
+
+        self._ff = ff
+        self._dtype = dtype
+        self._s = None
+        self._inv_s = None
+        self._fingerprint = None
+
+    @classmethod
+    def of(cls, ff: Union["FrequencyGrid", np.ndarray, float], dtype=None) -> "FrequencyGrid":
+        """
+        Return the argument if it is already a frequency grid, otherwise wrap it in one.
+
+        :param ff: A frequency grid, or the frequency/frequencies (in Hz) from which to construct one.
+        :param dtype: (optional) Complex dtype of the grid. A grid of another dtype is converted to this one.
+        :return FrequencyGrid: The frequency grid.
+        """
+
+        if isinstance(ff, cls):
+            return ff if dtype is None or np.dtype(dtype) == ff.dtype else cls(ff.ff, dtype)
+        return cls(ff, dtype)
+
+    @property
+    def ff(self) -> Union[np.ndarray, float]:
+        """The cyclic frequency or frequencies (in Hz) of the grid."""
+        return self._ff
+
+    @property
+    def dtype(self) -> np.dtype:
+        """Complex dtype of evaluations over the grid."""
+        return self._dtype
+
+    @property
+    def real_dtype(self) -> np.dtype:
+        """Real dtype of the same precision as the grid, that of element values and impedance magnitudes."""
+        return np.finfo(self._dtype).dtype
+
+    @property
+    def s(self) -> Union[np.ndarray, complex]:
+        """The Laplace variable s = j2πf at each frequency of the grid."""
+        if self._s is None:
+            s = 1j * 2 * np.pi * self._ff
+            self._s = s if self._dtype == np.complex128 else np.asarray(s, dtype=self._dtype)[()]
+        return self._s
+
+    @property
+    def inv_s(self) -> Union[np.ndarray, complex]:
+        """The reciprocal of the Laplace variable, 1/s, at each frequency of the grid."""
+        if self._inv_s is None:
+            # formed as -j/ω rather than 1/s so that it is -j∞ at f = 0, where capacitors are open circuits,
+            # instead of the ∞ + j·nan of complex division
+            with np.errstate(divide='ignore'):
+                imag = -1 / (2 * np.pi * np.asarray(self._ff, dtype=self.real_dtype))
+            inv_s = np.zeros(imag.shape, dtype=self._dtype)
+            inv_s.imag = imag
+            self._inv_s = inv_s[()]
+        return self._inv_s
+
+    @property
+    def fingerprint(self) -> int:
+        """
+        Hash of the grid's frequencies, identifying equal grids for caching.
+
+        .. note::
+
+            The fingerprint is computed once. Do not modify the frequency array in place after constructing the grid.
+        """
+        if self._fingerprint is None:
+            ff = np.asarray(self._ff)
+            self._fingerprint = hash((ff.shape, ff.dtype.str, ff.tobytes(), self._dtype.str))
+        return self._fingerprint
+
+    @property
+    def size(self) -> int:
+        """Number of frequencies in the grid."""
+        return np.size(self._ff)
+
+    @property
+    def shape(self) -> tuple:
+        """Shape of the frequency array, () for a single frequency."""
+        return np.shape(self._ff)
+
+    def expand(self, value):
+        """
+        Prepare a lumped-element value for broadcasting against the frequency axis.
+
+        Array values get trailing singleton axes for the frequency dimensions, so an array of N values evaluated over
+        M frequencies yields an (N, M) result. Values are converted to single precision on single-precision grids, so
+        that they do not promote the impedance to double precision; otherwise scalars are returned unchanged.
+
+        :param value: Element value, scalar or numpy array.
+        :return: The value, reshaped for broadcasting if it is an array.
+        """
+
+        if self._dtype != np.complex128:
+            value = np.asarray(value, dtype=self.real_dtype)
+            if value.ndim == 0:
+                return value[()]
+        if np.ndim(value) == 0 or np.ndim(self._ff) == 0:
+            return value
+        value = np.asarray(value)
+        return value.reshape(value.shape + (1,) * np.ndim(self._ff))
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index: slice) -> "FrequencyGrid":
+        """
+        Slice the grid along the frequency axis, sharing any Laplace-variable arrays already computed.
+
+        :param slice index: The slice of frequencies to take.
+        :return FrequencyGrid: Grid over the selected frequencies.
+        """
+
+        grid = FrequencyGrid(self._ff[..., index], self._dtype)
+        if self._s is not None:
+            grid._s = self._s[..., index]
+        if self._inv_s is not None:
+            grid._inv_s = self._inv_s[..., index]
+        return grid
+
+
 class Z(ABC):
     """Abstract representation of an impedance element."""
 
+    # Counter bumped whenever any impedance tree is modified in place. Derived data cached on a tree, such as its
+    # compiled evaluation plan, is tagged with the revision at which it was computed and discarded once stale.
+    _revision = 0
+
+    # frozen (immutable) nodes and their structural hash, see freeze()
+    _frozen = False
+    _hash = None
+
     @property
     @abstractmethod
     def prefix(self) -> str:
@@ -27,7 +180,14 @@ class Z(ABC):
 
     @subscript.setter
     def subscript(self, subs: Union[str, int]):
+        self._check_mutable()
         self._subscript = subs
+        Z._touch()
+
+    @property
+    def frozen(self) -> bool:
+        """True if this impedance is immutable, see :meth:`freeze`."""
+        return self._frozen
 
     @property
     def label(self):
@@ -37,7 +197,11 @@ class Z(ABC):
         return f"{self.prefix}{self.subscript}"
 
     def __init__(self, subs: Union[str, int] = ''):
-        self.subscript = subs
+        # a new node cannot belong to any existing tree, so there are no caches to invalidate
+        self._subscript = subs
+        self._plan = None
+        self._index = None
+        self._functions = None
 
     def __add__(self, other: "Z") -> "SeriesZ":
         """
@@ -53,8 +217,12 @@ class Z(ABC):
             # !! 2024.04.16 Do not flatten if this series impedance element has a subscript so that the
             # subscript is not lost.
             s = cast(SeriesZ, self)
+            if self._frozen:
+                return s._merged(other)
             s.merge(other)
             return s
+        elif self._frozen:
+            return SeriesZ(self, other.freeze())._seal()
         else:
             return SeriesZ(self, other)
 
@@ -72,8 +240,12 @@ class Z(ABC):
             # !! 2024.04.16 Do not flatten if this parallel impedance element has a subscript so that the
             # subscript is not lost.
             s = cast(ParallelZ, self)
+            if self._frozen:
+                return s._merged(other)
             s.merge(other)
             return s
+        elif self._frozen:
+            return ParallelZ(self, other.freeze())._seal()
         else:
             return ParallelZ(self, other)
 
@@ -84,15 +256,92 @@ class Z(ABC):
         .. note::
 
             Contrary to its normal use as an accessor on other objects such as lists, the subscript operator
-            `[]` assigns a subscript to an impedance in place.
+            `[]` assigns a subscript to an impedance in place. A frozen impedance is left unchanged, and a copy
+            with the subscript is returned instead.
 
         :param subscript: The subscript to assign to the impedance
-        :return Z: This impedance object.
+        :return Z: This impedance object, or the relabeled copy of a frozen impedance.
         """
 
+        if self._frozen:
+            z = self._copy()
+            z._subscript = subscript
+            return z._seal()
+
         self.subscript = subscript
         return self
 
+    def freeze(self) -> "Z":
+        """
+        Return an immutable copy of this impedance tree.
+
+        Frozen impedances cannot be modified: the operators return new impedances that share the unchanged
+        sub-trees of their operands instead of merging into or relabeling the left operand, and assigning
+        to a subscript raises. Frozen impedances are hashable and compare equal when structurally identical (same
+        element types, subscripts, and values connected in the same order), with the hash computed once on
+        construction, so they can serve as dictionary keys for memoization and deduplication. Derived data cached
+        on a frozen tree, such as its compiled plan, never goes stale, so the tree can be evaluated from many
+        threads without coordination.
+
+        Sub-trees shared within this tree remain shared in the copy. Element tolerances are carried over but are
+        not part of the structure.
+
+        :return Z: The frozen impedance, this impedance itself if it is already frozen.
+        """
+
+        if self._frozen:
+            return self
+
+        # iterative post-order walk, freezing children before their parents
+        frozen = {}
+        stack = [(self, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if id(node) in frozen:
+                continue
+            if node._frozen:
+                frozen[id(node)] = node
+                continue
+            if isinstance(node, CompositeZ) and not expanded:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node._children)
+                continue
+            z = node._copy()
+            if isinstance(node, CompositeZ):
+                z._children = tuple(frozen[id(child)] for child in node._children)
+            frozen[id(node)] = z._seal()
+        return frozen[id(self)]
+
+    def __hash__(self):
+        if not self._frozen:
+            return object.__hash__(self)
+        if self._hash is None:
+            # dropped on pickling, as string hashes differ between processes
+            self._rehash()
+        return self._hash
+
+    def __eq__(self, other):
+        if not isinstance(other, Z):
+            return NotImplemented
+        if not (self._frozen and other._frozen):
+            return self is other
+
+        # iterative comparison so that deep trees do not exhaust the recursion limit
+        stack = [(self, other)]
+        while stack:
+            a, b = stack.pop()
+            if a is b:
+                continue
+            if type(a) is not type(b) or hash(a) != hash(b) or a._subscript != b._subscript:
+                return False
+            if isinstance(a, CompositeZ):
+                if len(a._children) != len(b._children):
+                    return False
+                stack.extend(zip(a._children, cast(CompositeZ, b)._children))
+            elif not np.array_equal(a._value, b._value):
+                return False
+        return True
+
     def breakfreq(self, labels: str) -> float:
         """
         Compute the frequency at which the impedance of two lumped elements contained in this impedance are equal.
@@ -130,18 +379,323 @@ class Z(ABC):
         if element_set == {'L', 'C'}:
             return 1.0 / 2.0 / math.pi / math.sqrt(elements_dict['L'].value * elements_dict['C'].value)
 
-    @abstractmethod
-    def __call__(self, ff: Union[np.ndarray, float], **lumpedparam):
+    def compile(self) -> "CompiledZ":
+        """
+        Compile this impedance into a flat, non-recursive evaluation plan.
+
+        The plan is intended for repeated evaluation of the same network, for example in parameter sweeps. Calling
+        the plan with the same arguments as this impedance yields the same result.
+
+        :return CompiledZ: The evaluation plan.
+        """
+
+        # imported here to avoid a circular import; the compiled module depends on the classes defined below
+        from .compiled import CompiledZ
+        return CompiledZ(self)
+
+    def as_template(self, *columns: str) -> "Template":
+        """
+        Make a topology template of this impedance, for evaluating its structure over a matrix of element values,
+        e.g. ``Zout.as_template().evaluate(ff, values)`` with one design per row of values.
+
+        :param columns: Labels of the elements whose values form the columns of the value matrix, all elements'
+            labels by default.
+        :return Template: The template, see :class:`fastz.template.Template`.
+        :raises KeyError: when a column label does not name an element of this impedance.
+        """
+
+        from .template import Template
+        return Template(self, *columns)
+
+    def __getstate__(self):
+        # the cached plan holds scratch arrays that are cheaper to recompile than to pickle
+        state = self.__dict__.copy()
+        state['_plan'] = None
+        state['_index'] = None
+        state['_functions'] = None
+        state.pop('_hash', None)
+        return state
+
+    def to_rational(self, scale: float = None, **lumpedparam) -> "RationalZ":
+        """
+        Derive the rational-function representation N(s)/D(s) of this impedance from its series/parallel structure.
+
+        :param float scale: (optional) The angular frequency (in rad/s) by which to normalize the Laplace variable.
+        :param lumpedparam: Dictionary of scalar parameter values to associate with lumped elements.
+        :return RationalZ: The rational impedance, see :mod:`fastz.rational`.
+        :raises ValueError: when a lumped element has no value or a parameter value is an array.
+        """
+
+        from .rational import to_rational
+        return to_rational(self._compiled(), scale, **lumpedparam)
+
+    def poles(self, **lumpedparam) -> np.ndarray:
+        """
+        Compute the poles of this impedance from its rational-function representation.
+
+        :param lumpedparam: Dictionary of scalar parameter values to associate with lumped elements.
+        :return: Numpy array of complex poles (in rad/s). Complex poles locate the parallel resonances (impedance peaks),
+            see :func:`fastz.rational.natural_frequencies`.
+        """
+
+        return self.to_rational(**lumpedparam).poles()
+
+    def zeros(self, **lumpedparam) -> np.ndarray:
+        """
+        Compute the zeros of this impedance from its rational-function representation.
+
+        :param lumpedparam: Dictionary of scalar parameter values to associate with lumped elements.
+        :return: Numpy array of complex zeros (in rad/s). Complex zeros locate the series resonances (impedance dips),
+            see :func:`fastz.rational.natural_frequencies`.
+        """
+
+        return self.to_rational(**lumpedparam).zeros()
+
+    def residues(self, **lumpedparam) -> tuple:
+        """
+        Compute the partial-fraction expansion Z(s) = Σ r_k/(s - p_k) + k(s) of this impedance.
+
+        Use ``to_rational().to_pole_residue()`` for an impedance object that evaluates from this expansion.
+
+        :param lumpedparam: Dictionary of scalar parameter values to associate with lumped elements.
+        :return tuple: The residues r (in Ohm·rad/s), the poles p (in rad/s), and the coefficients of the direct
+            polynomial term k(s), highest power first.
+        :raises ValueError: when the impedance has repeated poles.
+        """
+
+        return self.to_rational(**lumpedparam).residues()
+
+    def _check_mutable(self):
+        """:raises AttributeError: when this impedance is frozen."""
+        if self._frozen:
+            raise AttributeError(f"Cannot modify frozen impedance '{self}'; operators return new impedances instead.")
+
+    def _copy(self) -> "Z":
+        """Return a shallow, mutable copy of this node, sharing its children and without cached derived data."""
+
+        z = object.__new__(type(self))
+        z.__dict__.update(self.__dict__)
+        z._frozen = False
+        z._hash = None
+        z._plan = z._index = z._functions = None
+        return z
+
+    def _seal(self) -> "Z":
+        """Freeze this node, whose children must already be frozen, and compute its structural hash."""
+
+        if isinstance(self, CompositeZ):
+            self._children = tuple(self._children)
+        self._frozen = True
+        self._rehash()
+        return self
+
+    def _rehash(self):
+        """Compute the structural hash of this frozen node, and of any frozen descendants lacking one."""
+
+        stack = [(self, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if node._hash is not None:
+                continue
+            if isinstance(node, CompositeZ):
+                if not expanded:
+                    stack.append((node, True))
+                    stack.extend((child, False) for child in node._children)
+                    continue
+                content = tuple(child._hash for child in node._children)
+            else:
+                value = cast(LumpedElement, node)._value
+                content = (np.shape(value), np.asarray(value).tobytes()) if np.ndim(value) else value
+            node._hash = hash((type(node).__name__, node._subscript, content))
+
+    @staticmethod
+    def _touch():
+        """Record an in-place modification of an impedance tree, invalidating cached derived data."""
+        Z._revision += 1
+
+    def _compiled(self) -> "CompiledZ":
+        """Return the evaluation plan for this impedance, recompiling only if a tree has been modified since."""
+
+        # frozen trees cannot change, so their plan is never stale
+        if self._plan is None or (self._plan[0] != Z._revision and not self._frozen):
+            self._plan = (Z._revision, self.compile())
+        return self._plan[1]
+
+    def _label_index(self) -> dict:
+        """
+        Return the index of this impedance tree, mapping each label to the distinct impedances that carry it in
+        depth-first (pre-)order. The index is built on first use and rebuilt only if a tree has been modified since.
+        """
+
+        if self._index is None or (self._index[0] != Z._revision and not self._frozen):
+            index = {}
+            seen = set()
+            stack = [self]
+            while stack:
+                node = stack.pop()
+                if id(node) in seen:
+                    continue
+                seen.add(id(node))
+                index.setdefault(node.label, []).append(node)
+                if isinstance(node, CompositeZ):
+                    stack.extend(reversed(node._children))
+            self._index = (Z._revision, index)
+        return self._index[1]
+
+    def duplicate_labels(self) -> dict:
+        """
+        Find labels shared by two or more distinct impedances within this impedance tree.
+
+        Such labels are ambiguous: :meth:`subz` returns only the first impedance found, and values passed on
+        evaluation apply to every lumped element with the label. The same impedance object connected at several
+        places in the tree is not a duplicate.
+
+        :return dict: Lists of the impedances sharing each duplicated label, in depth-first order, keyed by label.
+        """
+
+        return {label: list(nodes) for label, nodes in self._label_index().items() if len(nodes) > 1}
+
+    def codegen(self, *free: str):
+        """
+        Generate a flat Python function of the Laplace variable evaluating this impedance, with the values of all but
+        the free elements inlined, e.g. ``f = Zout.codegen('Rload'); f(1j * 2 * np.pi * ff, Rload=0.5)``.
+
+        The function is cached on this impedance and regenerated only after a tree is modified.
+
+        :param free: Labels of the elements whose values become arguments of the function.
+        :return: The compiled function, see :meth:`CompiledZ.codegen`.
+        """
+
+        if self._functions is None or (self._functions[0] != Z._revision and not self._frozen):
+            self._functions = (Z._revision, {})
+        functions = self._functions[1]
+        if free not in functions:
+            functions[free] = self._compiled().codegen(*free)
+        return functions[free]
+
+    def response(self, ff: Union[FrequencyGrid, np.ndarray, float], *, mag_only: bool = False,
+                 out: np.ndarray = None, dtype=None, **lumpedparam) -> "ImpedanceResponse":
+        """
+        Evaluate this impedance into a response object whose magnitude, dB, phase, real and imaginary parts, and
+        admittance are computed on first access and cached, e.g. ``Zout.response(ff).db``.
+
+        :param ff: The cyclic frequency or frequencies (in Hz) at which to evaluate the impedance, float or 1D numpy array.
+        :param bool mag_only: Compute only the impedance magnitude, written directly into a real array without
+            holding the complex impedance in memory. See :meth:`CompiledZ.magnitude`.
+        :param out: (optional) Array in which to store the impedance, complex, or real when `mag_only` is set.
+        :param dtype: (optional) Complex dtype of the evaluation, complex128 (the default) or complex64.
+        :param lumpedparam: Dictionary of parameter values to associate with lumped elements, as for the call operator.
+        :return ImpedanceResponse: The response, see :class:`fastz.response.ImpedanceResponse`.
+        """
+
+        from .response import ImpedanceResponse
+        if mag_only:
+            return ImpedanceResponse(ff, mag=self._compiled().magnitude(ff, out=out, dtype=dtype, **lumpedparam))
+        return ImpedanceResponse(ff, z=self(ff, out=out, dtype=dtype, **lumpedparam))
+
+    def eval_with_sensitivities(self, ff: Union[FrequencyGrid, np.ndarray, float], wrt: Union[str, list], *,
+                                dtype=None, **lumpedparam) -> tuple:
+        """
+        Evaluate this impedance together with its derivatives with respect to element values, in one pass over
+        the tree, e.g. ``z, dz = Zpdn.eval_with_sensitivities(ff, ['Rload', 'Cesr'])``.
+
+        :param ff: The cyclic frequency or frequencies (in Hz) at which to evaluate the impedance, float or 1D numpy array.
+        :param wrt: Labels of the elements with respect to whose values to differentiate, as a list or a
+            whitespace-separated string.
+        :param dtype: (optional) Complex dtype of the evaluation, complex128 (the default) or complex64.
+        :param lumpedparam: Dictionary of parameter values to associate with lumped elements, as for the call operator.
+        :return tuple: The complex impedance and a dictionary of the derivatives ∂Z/∂p keyed by label.
+            See :meth:`CompiledZ.eval_with_sensitivities`.
+        """
+
+        return self._compiled().eval_with_sensitivities(ff, wrt, dtype=dtype, **lumpedparam)
+
+    def gradient(self, ff: Union[FrequencyGrid, np.ndarray, float], target, weights=None, **lumpedparam) -> tuple:
+        """
+        Evaluate the weighted squared error Σ w·(|Z| - target)² of this impedance's magnitude against a target, e.g.
+        a measured impedance, and its gradient with respect to every element value in one reverse-mode pass.
+
+        :param ff: The cyclic frequency or frequencies (in Hz) at which to evaluate the impedance, float or 1D numpy array.
+        :param target: Target impedance magnitude (in Ohms) at each frequency.
+        :param weights: (optional) Weight of each frequency.
+        :param lumpedparam: Dictionary of parameter values to associate with lumped elements, as for the call operator.
+        :return tuple: The value of the objective and a dictionary of its gradient keyed by element label.
+            See :meth:`CompiledZ.gradient`.
+        """
+
+        return self._compiled().gradient(ff, target, weights, **lumpedparam)
+
+    def iter_eval(self, ff_source, chunk: int = 65536, dtype=None, **lumpedparam):
+        """
+        Evaluate this impedance chunk by chunk over a stream of frequencies, for grids too large to hold in memory.
+
+        :param ff_source: The frequencies (in Hz): a range specification tuple (start, stop, points[, 'lin' | 'log']),
+            a numpy array or memmap, or an iterable of frequencies such as a generator.
+            See :meth:`CompiledZ.iter_eval`.
+        :param int chunk: The number of frequencies per chunk.
+        :param dtype: (optional) Complex dtype of the evaluation, complex128 (the default) or complex64.
+        :param lumpedparam: Dictionary of parameter values to associate with lumped elements, as for the call operator.
+        :return: Iterator over (ff_chunk, z_chunk) pairs of frequency and impedance arrays.
+        """
+
+        return self._compiled().iter_eval(ff_source, chunk, dtype=dtype, **lumpedparam)
+
+    def __call__(self, ff: Union[FrequencyGrid, np.ndarray, float], *, out: np.ndarray = None, threads: int = None,
+                 backend: str = None, cache: "EvalCache" = None, dtype=None, **lumpedparam):
         """
         Return the complex representation of this impedance at a frequency or set of frequencies.
 
         :param ff: The cyclic frequency or frequencies (in Hz) at which to evaluate the impedance, float or 1D numpy array.
+            Pass a :class:`FrequencyGrid` to reuse the Laplace-variable arrays across calls.
+        :param out: (optional) Complex array in which to store the result. When supplied, the impedance is evaluated
+            with a cached compiled plan using preallocated scratch space, so repeated evaluations over the same
+            :class:`FrequencyGrid` allocate no new arrays; a plain frequency array is converted to a new grid on
+            every call, so it may be refilled in place between calls.
+        :param int threads: (optional) Number of threads among which to split long frequency arrays. When supplied,
+            the impedance is evaluated with a cached compiled plan in cache-sized chunks of frequencies.
+        :param str backend: (optional) Evaluation backend of the compiled plan, 'numpy' or 'numba'. When supplied,
+            the impedance is evaluated with a cached compiled plan; 'numba' fuses the whole network into one loop over
+            the frequencies and falls back to 'numpy' if numba is not installed. See :meth:`CompiledZ.__call__`.
+        :param EvalCache cache: (optional) Memoize the impedances of sub-trees in this cache, so that sub-trees whose
+            elements and frequencies are unchanged since an earlier call are not recomputed.
+            See :class:`fastz.cache.EvalCache`.
+        :param dtype: (optional) Complex dtype of the evaluation, complex128 (the default) or complex64 for single
+            precision. Defaults to the dtype of the `out` array or of a :class:`FrequencyGrid` when one is supplied.
         :param lumpedparam: Dictionary of parameter values to associate with lumped elements.
             Keys identify the element by label (concatenation of prefix and subscript - e.g. 'R1', 'Lt', 'Cp', 'Zxy')
             Values temporarily replace existing element values loaded on construction of the element.
-        :return: The complex impedance (in Ohms) at the specified frequency/frequencies, scalar or 1D numpy array.
+            Values may be numpy arrays to sweep the element in one vectorized evaluation; the frequency axis is
+            appended to the array's axes, so an array of N values over M frequencies yields an (N, M) result.
+            Array values supplied for several elements broadcast against each other.
+        :return: The complex impedance (in Ohms) at the specified frequency/frequencies, scalar or numpy array.
         :raises ValueError: when any parameter cannot be matched to a lumped element using the provided label.
         """
+
+        if dtype is None and out is not None and np.iscomplexobj(out):
+            dtype = out.dtype
+
+        if cache is not None:
+            z = cache.evaluate(self, FrequencyGrid.of(ff, dtype), lumpedparam)
+            if out is None:
+                return z
+            out[...] = z
+            return out
+
+        if out is not None or threads or backend:
+            return self._compiled()(ff, out=out, threads=threads, backend=backend or 'numpy', dtype=dtype,
+                                    **lumpedparam)
+
+        return self._evaluate(FrequencyGrid.of(ff, dtype), lumpedparam)
+
+    @abstractmethod
+    def _evaluate(self, grid: FrequencyGrid, lumpedparam: dict):
+        """
+        Evaluate this impedance over a frequency grid; the tree-walking counterpart of the call operator.
+
+        :param FrequencyGrid grid: The frequencies at which to evaluate the impedance.
+        :param dict lumpedparam: Dictionary of parameter values to associate with lumped elements.
+        :return: The complex impedance (in Ohms) at the frequencies of the grid.
+        """
         pass
 
     @abstractmethod
@@ -158,8 +712,8 @@ class Z(ABC):
 
         .. note::
 
-            If two or more sub-impedance's have the same label, the impedance returned is not well defined.
-            It varies with the tree structure and traversal algorithm.
+            If two or more sub-impedance's have the same label, the first found in a depth-first search of the tree
+            is returned. Use :meth:`duplicate_labels` to detect such labels.
 
         :param str label: The label for which to search the impedance tree.
         :return Z: The first impedance found that matches the provided label.
@@ -207,16 +761,25 @@ class CompositeZ(Z, ABC):
             return f"({text})"
 
     def subz(self, label: str):
-        if label == self.label:
-            return self
+        # constant-time lookup in the tree's label index
+        try:
+            return self._label_index()[label][0]
+        except KeyError:
+            raise KeyError(f"Could not locate impedance with the label '{label}' within '{self}'.") from None
 
-        for z in self._children:
-            try:
-                return z.subz(label)
-            except KeyError:
-                pass
+    def _evaluate(self, grid, lumpedparam):
+        # recurse the tree and combine the resulting impedance vectors
+        return self._combine(z._evaluate(grid, lumpedparam) for z in self._children)
 
-        raise KeyError(f"Could not locate impedance with the label '{label}' within '{self}'.")
+    @abstractmethod
+    def _combine(self, zz):
+        """
+        Combine the impedances of this composite's children into the impedance of the composite.
+
+        :param zz: Iterable over the children's impedances, in the order of the children.
+        :return: The impedance of the composite.
+        """
+        pass
 
     def merge(self, other: "Z"):
         """
@@ -230,14 +793,26 @@ class CompositeZ(Z, ABC):
 
         :param Z other: The impedance to merge with this composite impedance.
         :return: None
+        :raises AttributeError: when this impedance is frozen.
         """
 
+        self._check_mutable()
         if type(other) is type(self):
             # merge all of the children of the other impedance if it is a composite of the same type
             self._children.extend(cast(CompositeZ, other)._children)
         else:
             self._children.append(other)
 
+        Z._touch()
+
+    def _merged(self, other: "Z") -> "CompositeZ":
+        """Return a new frozen composite with the children of this frozen one and the other impedance merged in."""
+
+        other = other.freeze()
+        z = self._copy()
+        z._children = self._children + (other._children if type(other) is type(self) else (other,))
+        return z._seal()
+
 
 class SeriesZ(CompositeZ):
     """Tree node representing series connection of two or more impedance elements."""
@@ -246,9 +821,9 @@ class SeriesZ(CompositeZ):
     def _operator(self):
         return '+'
 
-    def __call__(self, ff, **lumpedparam):
-        # recurse the tree and add the resulting impedance vectors
-        return sum(z(ff, **lumpedparam) for z in self._children)
+    def _combine(self, zz):
+        # add the impedance vectors
+        return sum(zz)
 
 
 class ParallelZ(CompositeZ):
@@ -258,9 +833,9 @@ class ParallelZ(CompositeZ):
     def _operator(self):
         return '||'
 
-    def __call__(self, ff, **lumpedparam):
-        # recurse the tree and parallel the resulting impedance vectors
-        return 1 / sum(1 / z(ff, **lumpedparam) for z in self._children)
+    def _combine(self, zz):
+        # parallel the impedance vectors
+        return 1 / sum(1 / z for z in zz)
 
 
 # Lumped elements ------------------------------------------------------------------------------------------------------
@@ -277,9 +852,32 @@ class LumpedElement(Z, ABC):
     def value(self) -> float:
         return self._value
 
-    def __init__(self, subscript='', v: float = None):
+    @property
+    def tolerance(self):
+        """
+        Tolerance distribution of this element's value for Monte Carlo analysis, or None if the value is exact.
+        See :mod:`fastz.montecarlo`.
+        """
+        return self._tolerance
+
+    @tolerance.setter
+    def tolerance(self, tol):
+        self._check_mutable()
+        self._tolerance = tol
+
+    def __init__(self, subscript='', v: float = None, tol=None):
+        """
+        Initialize a lumped element.
+
+        :param subscript: The subscript to assign to this element.
+        :param float v: (optional) The value of this element. If omitted, the value must be supplied on evaluation.
+        :param tol: (optional) Tolerance of the value for Monte Carlo analysis, a distribution from
+            :mod:`fastz.montecarlo` or a number giving a uniformly-distributed tolerance in percent.
+        """
+
         super().__init__(subscript)
         self._value = v
+        self._tolerance = tol
 
     def __str__(self):
         if self._value is None:
@@ -293,9 +891,10 @@ class LumpedElement(Z, ABC):
         else:
             raise KeyError(f"Label '{label}' does not match '{self}'.")
 
-    def _lookup_value(self, **lumpedparam):
+    def _lookup_value(self, grid: FrequencyGrid, lumpedparam: dict):
         """
-        Fetch the value of this lumped element from either (a) the provided dictionary or (b) the initial value.
+        Fetch the value of this lumped element from either (a) the provided dictionary or (b) the initial value,
+        shaped for broadcasting against the frequency grid.
 
         :raises ValueError: on failure to find a value.
         """
@@ -309,7 +908,7 @@ class LumpedElement(Z, ABC):
         if value is None:
             raise ValueError(f"Value not found for element '{name}'.")
 
-        return value
+        return grid.expand(value)
 
 
 class R(LumpedElement):
@@ -323,8 +922,8 @@ class R(LumpedElement):
     def _unit(self):
         return 'Ω'
 
-    def __call__(self, ff, **lumpedparam):
-        return np.ones_like(ff) * self._lookup_value(**lumpedparam)
+    def _evaluate(self, grid, lumpedparam):
+        return np.ones(grid.shape, dtype=grid.real_dtype) * self._lookup_value(grid, lumpedparam)
 
 
 class C(LumpedElement):
@@ -338,8 +937,8 @@ class C(LumpedElement):
     def _unit(self):
         return 'F'
 
-    def __call__(self, ff, **lumpedparam):
-        return 1/(1j * 2 * np.pi * ff * self._lookup_value(**lumpedparam))
+    def _evaluate(self, grid, lumpedparam):
+        return grid.inv_s / self._lookup_value(grid, lumpedparam)
 
 
 class L(LumpedElement):
@@ -353,5 +952,5 @@ class L(LumpedElement):
     def _unit(self):
         return 'H'
 
-    def __call__(self, ff, **lumpedparam):
-        return 1j * 2 * np.pi *ff * self._lookup_value(**lumpedparam)
+    def _evaluate(self, grid, lumpedparam):
+        return grid.s * self._lookup_value(grid, lumpedparam)
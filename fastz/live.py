@@ -0,0 +1,156 @@
+"""
+Incremental re-evaluation of an impedance as element values change.
+
+.. moduleauthor:: whileman133
+
+"""
+
+from typing import Union, Dict, List
+import numpy as np
+
+from .core import FrequencyGrid, Z, LumpedElement, CompositeZ
+
+
+class LiveResponse:
+    """
+    Frequency response of an impedance that is kept up to date as element values change.
+
+    The impedance of every node in the tree is cached. Changing an element's value recomputes only the elements
+    with that label and the composites on their paths to the root, so the cost of an update grows with the depth
+    of the tree rather than its size. This suits interactive tuning and optimizer loops that change one or two
+    values at a time.
+
+    .. note::
+
+        Modifications are tracked by a single process-wide revision counter, so modifying any impedance tree in
+        place, even one unrelated to this response, makes the next update re-index and re-evaluate the whole tree,
+        and likewise drops the compiled plans, label indexes, generated functions, and :class:`EvalCache` entries
+        of all mutable trees.
+    """
+
+    def __init__(self, z: Z, ff: Union[FrequencyGrid, np.ndarray, float], **lumpedparam):
+        """
+        Evaluate an impedance and cache the impedance of each of its nodes.
+
+        :param Z z: The impedance to evaluate.
+        :param ff: The cyclic frequency or frequencies (in Hz) at which to evaluate the impedance, float, numpy array,
+            or frequency grid.
+        :param lumpedparam: Initial values of lumped elements, as for the call operator of the impedance.
+        :raises ValueError: when a lumped element has no value.
+        """
+
+        self._root = z
+        self._grid = FrequencyGrid.of(ff)
+        self._params = dict(lumpedparam)
+        self._rebuild()
+
+    @property
+    def grid(self) -> FrequencyGrid:
+        """The frequencies at which the impedance is evaluated."""
+        return self._grid
+
+    @property
+    def params(self) -> dict:
+        """The element values set on this response, keyed by label."""
+        return dict(self._params)
+
+    @property
+    def z(self):
+        """
+        The complex impedance (in Ohms) at the frequencies of the grid, for the current element values.
+
+        Updates replace rather than modify this array, so values fetched earlier remain valid.
+        """
+        return self._results[id(self._root)]
+
+    def __call__(self):
+        return self.z
+
+    def set_value(self, label: str, value):
+        """
+        Change the value of the lumped elements with a label and update the impedance.
+
+        :param str label: The label of the element(s) to change.
+        :param value: The new value of the element(s).
+        :return: The updated complex impedance.
+        :raises KeyError: when no lumped element has the label.
+        """
+
+        return self.update(**{label: value})
+
+    def update(self, **lumpedparam):
+        """
+        Change the values of several lumped elements at once and update the impedance.
+
+        :param lumpedparam: The new element values, keyed by label.
+        :return: The updated complex impedance.
+        :raises KeyError: when no lumped element has one of the labels.
+        """
+
+        if self._revision != Z._revision:
+            # the tree may have changed; check the labels against its current elements before rebuilding
+            index = self._root._label_index()
+            leaves = {label for label, nodes in index.items()
+                      if any(isinstance(node, LumpedElement) for node in nodes)}
+            self._check_labels(lumpedparam, leaves)
+            self._params.update(lumpedparam)
+            self._rebuild()
+            return self.z
+
+        self._check_labels(lumpedparam, self._leaves)
+        self._params.update(lumpedparam)
+
+        # mark the changed leaves and all of their ancestors
+        dirty = {}
+        pending = [leaf for label in lumpedparam for leaf in self._leaves[label]]
+        while pending:
+            node = pending.pop()
+            if id(node) not in dirty:
+                dirty[id(node)] = node
+                pending.extend(self._parents.get(id(node), ()))
+
+        # recompute in post-order so that children are updated before their parents
+        for node in sorted(dirty.values(), key=lambda n: self._order[id(n)]):
+            self._results[id(node)] = self._evaluate(node)
+
+        return self.z
+
+    def _check_labels(self, labels, leaves):
+        """:raises KeyError: when a label does not name a lumped element of the tree."""
+
+        for label in labels:
+            if label not in leaves:
+                raise KeyError(f"Could not locate lumped element with the label '{label}' within '{self._root}'.")
+
+    def _evaluate(self, node: Z):
+        """Evaluate one node from the cached impedances of its children."""
+
+        if isinstance(node, LumpedElement):
+            return node._evaluate(self._grid, self._params)
+        return node._combine(self._results[id(child)] for child in node._children)
+
+    def _rebuild(self):
+        """Index the tree and evaluate every node."""
+
+        self._revision = Z._revision
+        self._results = {}  # type: Dict[int, object]
+        self._parents = {}  # type: Dict[int, List[Z]]
+        self._leaves = {}  # type: Dict[str, List[LumpedElement]]
+        self._order = {}  # type: Dict[int, int]
+
+        # iterative post-order walk over unique nodes; shared sub-trees are visited once but may have several parents
+        stack = [(self._root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if id(node) in self._order:
+                continue
+            if isinstance(node, CompositeZ) and not expanded:
+                stack.append((node, True))
+                for child in reversed(node._children):
+                    self._parents.setdefault(id(child), []).append(node)
+                    stack.append((child, False))
+                continue
+            if isinstance(node, LumpedElement):
+                self._leaves.setdefault(node.label, []).append(node)
+            self._order[id(node)] = len(self._order)
+            self._results[id(node)] = self._evaluate(node)
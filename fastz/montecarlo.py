@@ -0,0 +1,239 @@
+"""
+Monte Carlo tolerance analysis of impedance networks.
+
+Element tolerances are attached to lumped elements on construction, e.g. ``C('out', 100e-6, tol=Normal(20))``.
+:func:`simulate` draws every toleranced element's value for all samples at once and evaluates the whole batch as
+array-valued parameters of a compiled plan, so no Python loop runs over the samples.
+
+.. moduleauthor:: whileman133
+
+"""
+
+from abc import ABC, abstractmethod
+from typing import Union, Dict
+import math
+import numpy as np
+
+from .core import FrequencyGrid, Z, LumpedElement
+from . import batch
+
+
+# Tolerance distributions ----------------------------------------------------------------------------------------------
+
+class Tolerance(ABC):
+    """Abstract distribution of a lumped element's value about its nominal value."""
+
+    def __init__(self, percent: float):
+        """
+        Initialize a tolerance.
+
+        :param float percent: The tolerance in percent of the nominal value.
+        :raises ValueError: when the tolerance is negative.
+        """
+
+        if percent < 0:
+            raise ValueError(f"Tolerance must be non-negative, got {percent}%.")
+        self._percent = percent
+
+    @property
+    def percent(self) -> float:
+        """The tolerance in percent of the nominal value."""
+        return self._percent
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self._percent})"
+
+    @abstractmethod
+    def sample(self, nominal: float, n: int, rng: np.random.Generator) -> np.ndarray:
+        """
+        Draw values of an element.
+
+        :param float nominal: The nominal value of the element.
+        :param int n: The number of values to draw.
+        :param rng: The random number generator from which to draw.
+        :return: Numpy array of n values.
+        """
+        pass
+
+
+class Uniform(Tolerance):
+    """Value distributed uniformly within ±percent of the nominal value."""
+
+    def sample(self, nominal, n, rng):
+        return nominal * (1 + self._percent / 100 * rng.uniform(-1, 1, n))
+
+
+class Normal(Tolerance):
+    """Value distributed normally about the nominal value, with ±percent spanning the given number of deviations."""
+
+    def __init__(self, percent: float, sigmas: float = 3):
+        """
+        Initialize a normally-distributed tolerance.
+
+        :param float percent: The tolerance in percent of the nominal value.
+        :param float sigmas: The number of standard deviations spanned by the tolerance.
+        """
+
+        super().__init__(percent)
+        self._sigmas = sigmas
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self._percent}, sigmas={self._sigmas})"
+
+    def sample(self, nominal, n, rng):
+        return nominal * (1 + self._percent / 100 / self._sigmas * rng.standard_normal(n))
+
+
+class LogNormal(Tolerance):
+    """
+    Value distributed log-normally about the nominal value, with a factor of (1 + percent/100) spanning the given
+    number of deviations. Unlike a normal tolerance, sampled values are always positive.
+    """
+
+    def __init__(self, percent: float, sigmas: float = 3):
+        """
+        Initialize a log-normally-distributed tolerance.
+
+        :param float percent: The tolerance in percent of the nominal value.
+        :param float sigmas: The number of standard deviations (in log space) spanned by the tolerance.
+        """
+
+        super().__init__(percent)
+        self._sigmas = sigmas
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self._percent}, sigmas={self._sigmas})"
+
+    def sample(self, nominal, n, rng):
+        return nominal * np.exp(math.log1p(self._percent / 100) / self._sigmas * rng.standard_normal(n))
+
+
+# Simulation -----------------------------------------------------------------------------------------------------------
+
+class MonteCarloResult:
+    """Impedance magnitudes of a Monte Carlo run with per-frequency summary statistics."""
+
+    def __init__(self, ff: np.ndarray, samples: Dict[str, np.ndarray], mag: np.ndarray):
+        """
+        Initialize a Monte Carlo result.
+
+        :param ff: The frequencies (in Hz) at which the impedance was evaluated.
+        :param dict samples: The sampled element values, keyed by element label.
+        :param mag: The (n_samples, n_freq) array of impedance magnitudes (in Ohms).
+        """
+
+        self.ff = ff
+        self.samples = samples
+        self.mag = mag
+
+    def __len__(self):
+        return len(self.mag)
+
+    @property
+    def mean(self) -> np.ndarray:
+        """Mean impedance magnitude at each frequency."""
+        return self.mag.mean(axis=0)
+
+    @property
+    def std(self) -> np.ndarray:
+        """Standard deviation of the impedance magnitude at each frequency."""
+        return self.mag.std(axis=0)
+
+    @property
+    def min(self) -> np.ndarray:
+        """Minimum impedance magnitude at each frequency."""
+        return self.mag.min(axis=0)
+
+    @property
+    def max(self) -> np.ndarray:
+        """Maximum impedance magnitude at each frequency."""
+        return self.mag.max(axis=0)
+
+    def percentile(self, q):
+        """
+        Compute percentiles of the impedance magnitude at each frequency.
+
+        :param q: Percentile or sequence of percentiles to compute, between 0 and 100.
+        :return: Numpy array of magnitudes with the percentiles along the first axis when q is a sequence.
+        """
+
+        return np.percentile(self.mag, q, axis=0)
+
+    def yield_below(self, limit: Union[np.ndarray, float]) -> float:
+        """
+        Compute the fraction of samples whose impedance magnitude stays at or below a limit at every frequency.
+
+        :param limit: The magnitude limit (in Ohms), scalar or numpy array with one limit per frequency.
+        :return float: The fraction of passing samples, between 0 and 1.
+        """
+
+        return float(np.mean(np.all(self.mag <= limit, axis=-1)))
+
+
+def sample(z: Z, n: int, seed=None, **lumpedparam) -> Dict[str, np.ndarray]:
+    """
+    Draw values of every toleranced lumped element in an impedance tree.
+
+    Elements are identified by label, so elements sharing a label share their drawn values, as they share values
+    supplied on evaluation.
+
+    :param Z z: The impedance tree.
+    :param int n: The number of values to draw for each element.
+    :param seed: (optional) Seed or numpy random generator for reproducible draws.
+    :param lumpedparam: Nominal values overriding those loaded on construction of the elements.
+    :return dict: Numpy arrays of n values, keyed by element label.
+    :raises ValueError: when a toleranced element has no nominal value.
+    """
+
+    rng = np.random.default_rng(seed)
+    samples = {}
+    for leaf in _leaves(z):
+        if leaf.tolerance is None or leaf.label in samples:
+            continue
+
+        nominal = lumpedparam.get(leaf.label, leaf.value)
+        if nominal is None:
+            raise ValueError(f"Value not found for element '{leaf.label}'.")
+
+        tol = leaf.tolerance if isinstance(leaf.tolerance, Tolerance) else Uniform(leaf.tolerance)
+        samples[leaf.label] = tol.sample(nominal, n, rng)
+
+    return samples
+
+
+def simulate(z: Z, ff: Union[FrequencyGrid, np.ndarray], n: int, seed=None, chunk: int = 4096, workers: int = None,
+             dtype=None, **lumpedparam) -> MonteCarloResult:
+    """
+    Run a Monte Carlo tolerance analysis of an impedance.
+
+    :param Z z: The impedance to analyze.
+    :param ff: The frequencies (in Hz) at which to evaluate the impedance, 1D numpy array or frequency grid.
+    :param int n: The number of samples.
+    :param seed: (optional) Seed or numpy random generator for reproducible draws.
+    :param int chunk: The number of samples evaluated per vectorized pass. Bounds the size of the complex scratch
+        array to chunk x n_freq.
+    :param int workers: (optional) Number of worker processes among which to split the samples,
+        see :func:`fastz.batch.evaluate`.
+    :param dtype: (optional) Complex dtype of the evaluation. Pass complex64 to compute in single precision and
+        return float32 magnitudes, halving the memory taken by the result.
+    :param lumpedparam: Values for lumped elements, nominal values for toleranced elements.
+    :return MonteCarloResult: The sampled element values and impedance magnitudes.
+    """
+
+    grid = FrequencyGrid.of(ff, dtype)
+    samples = sample(z, n, seed, **lumpedparam)
+    scalars = {label: v for label, v in lumpedparam.items() if label not in samples}
+    mag = batch.run(z, grid, n, samples, scalars, workers=workers, chunk=chunk, magnitude=True)
+    return MonteCarloResult(grid.ff, samples, mag)
+
+
+def _leaves(z: Z):
+    """Iterate over the lumped elements of an impedance tree in depth-first order."""
+
+    stack = [z]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, LumpedElement):
+            yield node
+        else:
+            stack.extend(reversed(node._children))
@@ -5,7 +5,8 @@ Impedance plotting utilities.
 
 """
 
-from fastz import Z, L, C
+from typing import Union
+from fastz import FrequencyGrid, Z, L, C
 
 import numpy as np
 import matplotlib.pyplot as plt
@@ -42,18 +43,20 @@ def annotation_for(z: Z) -> str:
     return annotation_text
 
 
-def bodez(targetz: Z, ff: np.ndarray, ax: axes = None, zlines='', refzlines='', **lumpedparam):
+def bodez(targetz: Z, ff: Union[FrequencyGrid, np.ndarray], ax: axes = None, zlines='', refzlines='',
+          dtype=None, **lumpedparam):
     """
     Draw the Bode magnitude plot of an impedance using matplotlib.
 
     :param Z targetz: The impedance object to plot.
-    :param ff: Numpy array of frequencies over which to compute and plot the impedance magnitude.
+    :param ff: Numpy array or frequency grid of frequencies over which to compute and plot the impedance magnitude.
     :param ax: (optional) The matplotlib axes on which to plot. A new axes is constructed if not supplied.
     :param str zlines: Whitespace-separated list of sub-impedances to plot, identified by label.
         Use the colon notation '<label>:<annotation_hp>' to specify the horizontal position of the annotation in
         plot units (frequency in Hz, scientific notation supported).
     :param str refzlines: Whitespace-separated list of sub-impedances to plot as reference lines, identified by label.
         This is commonly used to show R, L, and C impedance asymptotes.
+    :param dtype: (optional) Complex dtype of the evaluation; complex64 is ample for plotting and halves memory use.
     :param lumpedparam: Lumped parameter values to associate with the impedance before evaluating the magnitude.
     :return tuple: tuple containing the matplotlib figure and axes
     """
@@ -89,12 +92,16 @@ def bodez(targetz: Z, ff: np.ndarray, ax: axes = None, zlines='', refzlines='',
     def plot_line(z1: Z, annotation_hpos: int, plotopts: dict, annotateopts: dict, annotateboxopts: dict):
         """Plot the specified impedance on the axes."""
 
-        mm = abs(z1(ff, **lumpedparam))
+        mm = z1.response(grid, mag_only=True, **lumpedparam).mag
         ax.loglog(ff, mm, **plotopts)
         annotation = ax.annotate(annotation_for(z1), (ff[annotation_hpos], mm[annotation_hpos]),
                                  ha='center', va='center', **annotateopts)
         annotation.set_bbox(dict(boxstyle='square,pad=0', **annotateboxopts))
 
+    # share one set of Laplace-variable arrays among all of the impedance curves
+    grid = FrequencyGrid.of(ff, dtype)
+    ff = grid.ff
+
     # parse and collect impedance line specifications
     zlinespec = {label: hp for label, hp in [parse_zarg(arg, default_hp=ff[-1]) for arg in zlines.split()]}
     reflinespec = {label: hp for label, hp in [parse_zarg(arg, default_hp=ff[0]) for arg in refzlines.split()]}
@@ -0,0 +1,356 @@
+"""
+Rational-function (transfer function) representation of impedance networks.
+
+Every series/parallel RLC network has an impedance Z(s) = N(s)/D(s), a ratio of polynomials in the Laplace variable
+s. :func:`to_rational` derives N and D from the structure of the network, and :class:`RationalZ` evaluates them
+over any frequency grid with Horner's method. The poles, zeros, and partial-fraction (pole-residue) expansion
+follow from N and D, see :class:`PoleResidueZ`.
+
+.. moduleauthor:: whileman133
+
+"""
+
+from typing import Union, Tuple
+import math
+import numpy as np
+
+from .core import FrequencyGrid, Z
+from .compiled import CompiledZ, OP_R, OP_L, OP_C, OP_SERIES, OP_PARALLEL, OP_STORE, OP_LOAD
+
+
+class RationalZ:
+    """
+    Impedance represented as a ratio of polynomials, Z = N(x)/D(x), in the normalized Laplace variable x = s/scale.
+
+    Coefficients are ordered from the highest power to the constant term, as for :func:`numpy.polyval`.
+    Normalizing the Laplace variable keeps the coefficients of high-order networks within floating-point range; the
+    default scale is the logarithmic mean of the characteristic frequencies of the network's inductors and capacitors.
+    """
+
+    def __init__(self, num, den, scale: float = 1.0):
+        """
+        Initialize a rational impedance.
+
+        :param num: Numerator coefficients, highest power first.
+        :param den: Denominator coefficients, highest power first.
+        :param float scale: The angular frequency (in rad/s) by which the Laplace variable is normalized.
+        :raises ValueError: when the denominator is identically zero.
+        """
+
+        self._num = np.trim_zeros(np.atleast_1d(np.asarray(num, dtype=float)), 'f')
+        self._den = np.trim_zeros(np.atleast_1d(np.asarray(den, dtype=float)), 'f')
+        self._scale = float(scale)
+
+        if not len(self._den):
+            raise ValueError("The denominator of a rational impedance cannot be zero.")
+        if not len(self._num):
+            self._num = np.zeros(1)
+
+    @property
+    def num(self) -> np.ndarray:
+        """Numerator coefficients in the normalized Laplace variable, highest power first."""
+        return self._num
+
+    @property
+    def den(self) -> np.ndarray:
+        """Denominator coefficients in the normalized Laplace variable, highest power first."""
+        return self._den
+
+    @property
+    def scale(self) -> float:
+        """The angular frequency (in rad/s) by which the Laplace variable is normalized."""
+        return self._scale
+
+    @property
+    def order(self) -> int:
+        """Order of the network, the larger of the degrees of the numerator and denominator."""
+        return max(len(self._num), len(self._den)) - 1
+
+    def __repr__(self):
+        return f"<{type(self).__name__} order {self.order}, scale {self._scale:g} rad/s>"
+
+    def __call__(self, ff: Union[FrequencyGrid, np.ndarray, float]):
+        """
+        Evaluate the impedance at a frequency or set of frequencies.
+
+        :param ff: The cyclic frequency or frequencies (in Hz) at which to evaluate the impedance, float, numpy array,
+            or frequency grid.
+        :return: The complex impedance (in Ohms) at the specified frequency/frequencies, scalar or numpy array.
+        """
+
+        x = FrequencyGrid.of(ff).s / self._scale
+        return _horner(self._num, x) / _horner(self._den, x)
+
+    def unscaled(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the numerator and denominator coefficients in the Laplace variable s itself.
+
+        .. note::
+
+            For high-order networks the unscaled coefficients may overflow or underflow.
+
+        :return tuple: Numerator and denominator coefficients, highest power first.
+        """
+
+        def unscale(p):
+            return p / self._scale ** np.arange(len(p) - 1, -1, -1)
+
+        return unscale(self._num), unscale(self._den)
+
+    def poles(self) -> np.ndarray:
+        """
+        Compute the poles of the impedance, the roots of D(s).
+
+        :return: Numpy array of complex poles (in rad/s).
+        """
+
+        return np.roots(self._den) * self._scale
+
+    def zeros(self) -> np.ndarray:
+        """
+        Compute the zeros of the impedance, the roots of N(s).
+
+        :return: Numpy array of complex zeros (in rad/s).
+        """
+
+        return np.roots(self._num) * self._scale
+
+    def residues(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Compute the partial-fraction expansion Z(s) = Σ r_k/(s - p_k) + k(s).
+
+        :return tuple: The residues r (in Ohm·rad/s), the poles p (in rad/s), and the coefficients of the direct
+            polynomial term k(s), highest power first.
+        :raises ValueError: when the impedance has repeated poles.
+        """
+
+        expansion = self.to_pole_residue()
+        return expansion.residues, expansion.poles, expansion.direct
+
+    def to_pole_residue(self, rtol: float = 1e-6) -> "PoleResidueZ":
+        """
+        Convert to the pole-residue form of the impedance, which evaluates in time proportional to the number of poles.
+
+        :param float rtol: Relative distance below which two poles are considered repeated.
+        :return PoleResidueZ: The impedance in pole-residue form.
+        :raises ValueError: when the impedance has repeated poles, which the pole-residue form does not represent.
+        """
+
+        direct, remainder = np.polydiv(self._num, self._den)
+
+        # poles and residues in the normalized variable x = s/scale
+        poles = np.roots(self._den)
+        for i, p in enumerate(poles):
+            others = np.delete(poles, i)
+            if len(others) and np.min(np.abs(others - p)) <= rtol * max(abs(p), 1.0):
+                raise ValueError(f"The impedance has a repeated pole near {p * self._scale:g} rad/s; "
+                                 f"its pole-residue form is not supported.")
+        residues = np.polyval(remainder, poles) / np.polyval(np.polyder(self._den), poles)
+
+        return PoleResidueZ(residues, poles, direct, self._scale)
+
+    def to_dict(self) -> dict:
+        """
+        Serialize this impedance to a dictionary of plain Python numbers, e.g. for JSON.
+
+        :return dict: The coefficients and scale.
+        """
+
+        return {'num': self._num.tolist(), 'den': self._den.tolist(), 'scale': self._scale}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "RationalZ":
+        """
+        Deserialize an impedance produced by :meth:`to_dict`.
+
+        :param dict d: The coefficients and scale.
+        :return RationalZ: The impedance.
+        """
+
+        return cls(d['num'], d['den'], d.get('scale', 1.0))
+
+
+class PoleResidueZ:
+    """
+    Impedance represented by its partial-fraction expansion Z = Σ r_k/(x - p_k) + k(x), in the normalized Laplace
+    variable x = s/scale.
+
+    Evaluation costs one complex division per pole at each frequency, independent of the size of the network the
+    expansion was derived from.
+    """
+
+    def __init__(self, residues, poles, direct, scale: float = 1.0):
+        """
+        Initialize an impedance in pole-residue form.
+
+        :param residues: Residues of the poles in the normalized variable.
+        :param poles: Poles in the normalized variable.
+        :param direct: Coefficients of the direct polynomial term in the normalized variable, highest power first.
+        :param float scale: The angular frequency (in rad/s) by which the Laplace variable is normalized.
+        """
+
+        self._residues = np.asarray(residues, dtype=complex)
+        self._poles = np.asarray(poles, dtype=complex)
+        self._direct = np.atleast_1d(np.asarray(direct, dtype=float))
+        self._scale = float(scale)
+
+    @property
+    def poles(self) -> np.ndarray:
+        """Poles (in rad/s)."""
+        return self._poles * self._scale
+
+    @property
+    def residues(self) -> np.ndarray:
+        """Residues (in Ohm·rad/s) of the poles."""
+        return self._residues * self._scale
+
+    @property
+    def direct(self) -> np.ndarray:
+        """Coefficients of the direct polynomial term k(s), highest power first."""
+        return self._direct / self._scale ** np.arange(len(self._direct) - 1, -1, -1)
+
+    def __len__(self):
+        return len(self._poles)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {len(self._poles)} poles, scale {self._scale:g} rad/s>"
+
+    def __call__(self, ff: Union[FrequencyGrid, np.ndarray, float]):
+        """
+        Evaluate the impedance at a frequency or set of frequencies.
+
+        :param ff: The cyclic frequency or frequencies (in Hz) at which to evaluate the impedance, float, numpy array,
+            or frequency grid.
+        :return: The complex impedance (in Ohms) at the specified frequency/frequencies, scalar or numpy array.
+        """
+
+        x = FrequencyGrid.of(ff).s / self._scale
+        z = _horner(self._direct, x)
+        if np.ndim(x):
+            term = np.empty_like(z)
+            for r, p in zip(self._residues, self._poles):
+                np.subtract(x, p, out=term)
+                np.divide(r, term, out=term)
+                z += term
+            return z
+        return z + np.sum(self._residues / (x - self._poles))
+
+
+def natural_frequencies(roots: np.ndarray) -> np.ndarray:
+    """
+    Convert poles or zeros to natural frequencies, e.g. the resonant frequencies of an impedance.
+
+    Complex-conjugate pairs are reported once. Poles give the frequencies of impedance peaks (parallel resonances);
+    zeros give the frequencies of impedance dips (series resonances).
+
+    :param roots: Numpy array of complex poles or zeros (in rad/s).
+    :return: Sorted numpy array of undamped natural frequencies (in Hz) of the complex roots.
+    """
+
+    roots = np.asarray(roots)
+    return np.sort(np.abs(roots[roots.imag > 0])) / 2 / math.pi
+
+
+def to_rational(z: Union[Z, CompiledZ], scale: float = None, **lumpedparam) -> RationalZ:
+    """
+    Derive the rational-function representation of an impedance from its series/parallel structure.
+
+    :param z: The impedance, or a plan compiled from it.
+    :param float scale: (optional) The angular frequency (in rad/s) by which to normalize the Laplace variable.
+    :param lumpedparam: Dictionary of scalar parameter values to associate with lumped elements.
+    :return RationalZ: The rational impedance.
+    :raises ValueError: when a lumped element has no value or a parameter value is an array.
+    """
+
+    plan = z if isinstance(z, CompiledZ) else z.compile()
+    values = plan._resolve(FrequencyGrid(1.0), lumpedparam)
+    if any(np.ndim(v) for v in values):
+        raise ValueError("Rational representations require scalar element values.")
+
+    if scale is None:
+        scale = _default_scale(plan, values)
+
+    # evaluate the program over polynomial fractions (num, den) instead of arrays
+    stack = []
+    stored = {}
+    for op, arg, _ in plan._program:
+        if op == OP_R:
+            stack.append((np.array([values[arg]], dtype=float), np.ones(1)))
+        elif op == OP_L:
+            stack.append((np.array([values[arg] * scale, 0.0]), np.ones(1)))
+        elif op == OP_C:
+            stack.append((np.ones(1), np.array([values[arg] * scale, 0.0])))
+        elif op == OP_STORE:
+            stored[arg] = stack[-1]
+        elif op == OP_LOAD:
+            stack.append(stored[arg])
+        else:
+            children = stack[-arg:]
+            del stack[-arg:]
+            if op == OP_SERIES:
+                stack.append(_normalize(*_sum(children)))
+            else:
+                # sum the admittances and invert
+                y_num, y_den = _sum([(den, num) for num, den in children])
+                stack.append(_normalize(y_den, y_num))
+
+    num, den = stack[0]
+    return RationalZ(num, den, scale)
+
+
+def _sum(fractions: list) -> tuple:
+    """Add polynomial fractions (num, den), sharing the denominator where the denominators are equal."""
+
+    num, den = fractions[0]
+    for n, d in fractions[1:]:
+        if len(d) == len(den) and np.allclose(d, den, rtol=1e-12, atol=0):
+            # identical branches (e.g. repeated balls or vias) do not raise the order of the network
+            num = np.polyadd(num, n)
+        else:
+            num = np.polyadd(np.polymul(num, d), np.polymul(n, den))
+            den = np.polymul(den, d)
+    return num, den
+
+
+def _normalize(num: np.ndarray, den: np.ndarray) -> tuple:
+    """
+    Cancel the common power of the Laplace variable of a fraction and scale it so that the largest denominator
+    coefficient has unit magnitude.
+    """
+
+    k = np.max(np.abs(den))
+    if k == 0:
+        raise ValueError("Rational representation has a zero denominator; the network contains a short or open "
+                         "circuit that cannot be represented.")
+
+    # combining inductors or capacitors multiplies their factors of s, e.g. L1 || L2 = L1 L2 s^2 / ((L1 + L2) s);
+    # those coefficients are exact zeros, so the spurious poles and zeros at the origin are cancelled exactly
+    if np.any(num):
+        common = min(_trailing_zeros(num), _trailing_zeros(den))
+        if common:
+            num, den = num[:-common], den[:-common]
+    return num / k, den / k
+
+
+def _trailing_zeros(p: np.ndarray) -> int:
+    """Count the zero low-order coefficients of a polynomial, the multiplicity of its root at the origin."""
+
+    nonzero = np.flatnonzero(p)
+    return len(p) - 1 - nonzero[-1]
+
+
+def _default_scale(plan: CompiledZ, values: list) -> float:
+    """Logarithmic mean of the characteristic frequencies 1/L and 1/C (rad/s, with a 1Ω reference) of the network."""
+
+    logs = [-math.log(abs(values[arg])) for op, arg, _ in plan._program if op in (OP_L, OP_C) and values[arg]]
+    return math.exp(sum(logs) / len(logs)) if logs else 1.0
+
+
+def _horner(p: np.ndarray, x):
+    """Evaluate a polynomial with Horner's method, updating one accumulator in place."""
+
+    y = np.full(np.shape(x), p[0], dtype=complex)
+    for c in p[1:]:
+        y *= x
+        y += c
+    return y if np.ndim(x) else y[()]
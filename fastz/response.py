@@ -0,0 +1,133 @@
+"""
+Frequency responses of impedances with lazily derived magnitude, phase, and admittance.
+
+.. moduleauthor:: whileman133
+
+"""
+
+from typing import Union
+import numpy as np
+
+from .core import FrequencyGrid
+
+
+class ImpedanceResponse:
+    """
+    Impedance of a network over a set of frequencies, with derived quantities computed on first access and cached.
+
+    The real and imaginary parts are views of the complex impedance rather than copies. A magnitude-only response,
+    from ``Z.response(ff, mag_only=True)``, holds just the magnitude in a real array, half the size of the complex
+    impedance; its magnitude-derived quantities are available, while those needing the phase raise
+    :class:`ValueError`.
+    """
+
+    def __init__(self, ff: Union[FrequencyGrid, np.ndarray, float], z=None, mag=None):
+        """
+        Initialize a response from a complex impedance or, for a magnitude-only response, its magnitude.
+
+        :param ff: The frequencies (in Hz) of the response, float, numpy array, or frequency grid.
+        :param z: The complex impedance (in Ohms) at the frequencies.
+        :param mag: The impedance magnitude (in Ohms), in place of the complex impedance.
+        :raises ValueError: when neither or both of the impedance and its magnitude are supplied.
+        """
+
+        if (z is None) == (mag is None):
+            raise ValueError("Expected either the complex impedance or its magnitude.")
+
+        self._ff = ff.ff if isinstance(ff, FrequencyGrid) else ff
+        self._z = z
+        self._mag = mag
+        self._db = None
+        self._phase = None
+        self._phase_deg = None
+        self._admittance = None
+
+    def __repr__(self):
+        kind = "magnitude" if self.mag_only else "impedance"
+        return f"<{type(self).__name__} {kind} of shape {np.shape(self._data)}>"
+
+    def __len__(self):
+        return len(self._data)
+
+    def __array__(self, dtype=None, copy=None):
+        data = np.asarray(self._data)
+        return data if dtype is None else data.astype(dtype)
+
+    @property
+    def _data(self):
+        return self._mag if self._z is None else self._z
+
+    @property
+    def mag_only(self) -> bool:
+        """True if this response holds only the impedance magnitude."""
+        return self._z is None
+
+    @property
+    def ff(self) -> Union[np.ndarray, float]:
+        """The frequencies (in Hz) of the response."""
+        return self._ff
+
+    @property
+    def shape(self) -> tuple:
+        """Shape of the response, that of the frequencies or the broadcast shape of parameters and frequencies."""
+        return np.shape(self._data)
+
+    @property
+    def z(self):
+        """The complex impedance (in Ohms)."""
+        return self._complex('z')
+
+    @property
+    def mag(self):
+        """The impedance magnitude |Z| (in Ohms)."""
+        if self._mag is None:
+            self._mag = np.abs(self._z)
+        return self._mag
+
+    @property
+    def db(self):
+        """The impedance magnitude in decibels relative to one Ohm, 20·log10|Z|."""
+        if self._db is None:
+            with np.errstate(divide='ignore'):
+                db = np.log10(self.mag)
+            self._db = np.multiply(db, 20, out=db) if isinstance(db, np.ndarray) else 20 * db
+        return self._db
+
+    @property
+    def phase(self):
+        """The impedance phase angle (in radians)."""
+        if self._phase is None:
+            self._phase = np.angle(self._complex('phase'))
+        return self._phase
+
+    @property
+    def phase_deg(self):
+        """The impedance phase angle (in degrees)."""
+        if self._phase_deg is None:
+            self._phase_deg = np.degrees(self.phase)
+        return self._phase_deg
+
+    @property
+    def real(self):
+        """The resistance Re(Z) (in Ohms), a view of the complex impedance."""
+        return self._complex('real').real
+
+    @property
+    def imag(self):
+        """The reactance Im(Z) (in Ohms), a view of the complex impedance."""
+        return self._complex('imag').imag
+
+    @property
+    def admittance(self):
+        """The complex admittance Y = 1/Z (in Siemens)."""
+        if self._admittance is None:
+            with np.errstate(divide='ignore'):
+                self._admittance = np.reciprocal(self._complex('admittance'))
+        return self._admittance
+
+    def _complex(self, name: str):
+        """Return the complex impedance, :raises ValueError: for a magnitude-only response."""
+        if self._z is None:
+            raise ValueError(f"The {name} of a magnitude-only response is not available; "
+                             f"evaluate the response with mag_only=False.")
+        return self._z
@@ -0,0 +1,112 @@
+"""
+Topology templates: one network structure evaluated for many sets of element values.
+
+.. moduleauthor:: whileman133
+
+"""
+
+from typing import Union, List
+import numpy as np
+
+from .core import FrequencyGrid, Z
+
+
+class Template:
+    """
+    Network topology with its element values supplied as the columns of a matrix.
+
+    A template is made from an impedance with :meth:`Z.as_template`. The structure is frozen and compiled once, and
+    each row of a value matrix is one design: evaluating the template over an (n_designs, n_columns) matrix yields the
+    (n_designs, n_freq) impedances in one vectorized pass of the compiled plan, with no Python objects created per
+    design. This suits design-space exploration over thousands of value combinations of one topology.
+
+    Columns are element labels, so elements that share a label share a column.
+    """
+
+    def __init__(self, z: Z, *columns: str):
+        """
+        Make a template of an impedance.
+
+        :param Z z: The impedance whose structure to use. The template is unaffected by later changes to it.
+        :param columns: Labels of the elements whose values form the columns of the value matrix, all elements'
+            labels in order of first appearance by default. The other elements keep their values.
+        :raises KeyError: when a column label does not name an element of the impedance.
+        """
+
+        self._z = z.freeze()
+        self._plan = self._z._compiled()
+        for label in columns:
+            if label not in self._plan.labels:
+                raise KeyError(f"Could not locate lumped element with the label '{label}' within '{z}'.")
+        self._columns = list(columns) or self._plan.labels
+
+    @property
+    def z(self) -> Z:
+        """The frozen impedance defining the template's structure and default values."""
+        return self._z
+
+    @property
+    def columns(self) -> List[str]:
+        """Element labels of the columns of the value matrix."""
+        return list(self._columns)
+
+    def __len__(self):
+        return len(self._columns)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self._z.label}: {', '.join(self._columns)}>"
+
+    def index(self, label: str) -> int:
+        """
+        Return the column of an element.
+
+        :raises ValueError: when the label is not a column.
+        """
+        return self._columns.index(label)
+
+    def defaults(self) -> np.ndarray:
+        """
+        Return the row of default values of the columns, NaN for elements without a value; a starting point for
+        building value matrices, e.g. ``np.tile(template.defaults(), (n, 1))``.
+        """
+
+        defaults = {label: value for label, value in zip(self._plan._labels, self._plan._defaults)}
+        return np.array([np.nan if defaults[label] is None else defaults[label] for label in self._columns])
+
+    def evaluate(self, ff: Union[FrequencyGrid, np.ndarray, float], values: np.ndarray, out: np.ndarray = None,
+                 chunk: int = None, dtype=None, **lumpedparam) -> np.ndarray:
+        """
+        Evaluate the template for a matrix of element values.
+
+        :param ff: The cyclic frequency or frequencies (in Hz) at which to evaluate the impedance, float or 1D numpy
+            array.
+        :param values: (n_designs, n_columns) array of element values, one design per row.
+        :param out: (optional) Complex array of shape (n_designs, n_freq) in which to store the result.
+        :param int chunk: (optional) Number of designs evaluated per pass, bounding the size of the scratch arrays
+            to chunk x n_freq per register. All designs are evaluated in one pass by default.
+        :param dtype: (optional) Complex dtype of the evaluation, complex128 (the default) or complex64.
+        :param lumpedparam: Values of elements that are not columns, shared by all designs.
+        :return: Numpy array of shape (n_designs, n_freq) holding the impedance (in Ohms) of each design.
+            The `out` array is returned when supplied.
+        :raises ValueError: when the value matrix has the wrong shape or an element has no value.
+        """
+
+        values = np.asarray(values, dtype=float)
+        if values.ndim != 2 or values.shape[1] != len(self._columns):
+            raise ValueError(f"Expected an (n_designs, {len(self._columns)}) value matrix, "
+                             f"got array of shape {values.shape}.")
+
+        if dtype is None and out is not None and np.iscomplexobj(out):
+            dtype = out.dtype
+        grid = FrequencyGrid.of(ff, dtype)
+        n = len(values)
+        if out is None:
+            out = np.empty((n,) + grid.shape, dtype=grid.dtype)
+
+        chunk = chunk or max(n, 1)
+        for start in range(0, n, chunk):
+            stop = min(start + chunk, n)
+            params = dict(lumpedparam)
+            params.update((label, values[start:stop, k]) for k, label in enumerate(self._columns))
+            self._plan(grid, out=out[start:stop], **params)
+        return out
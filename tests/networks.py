@@ -0,0 +1,22 @@
+"""
+Shared test networks.
+"""
+
+from fastz.core import R, L, C
+from fastz.montecarlo import Normal, LogNormal
+
+
+def smps_zout(rload=1.0):
+    """Output impedance of a buck converter: output capacitor, inductor, and load, with a missing load value if None."""
+
+    Zcap = (R('esr', 5e-3) + L('esl', 1e-9) + C('out', 100e-6))['cap']
+    Zind = (R('dcr', 10e-3) + L('out', 2.2e-6))['ind']
+    return (Zcap // Zind // R('load', rload))['out']
+
+
+def smps_zout_tol():
+    """The buck converter output impedance with tolerances on the capacitor ESR and value and on the inductance."""
+
+    Zcap = (R('esr', 5e-3, tol=LogNormal(30)) + L('esl', 1e-9) + C('out', 100e-6, tol=Normal(20)))['cap']
+    Zind = (R('dcr', 10e-3) + L('out', 2.2e-6, tol=10))['ind']
+    return (Zcap // Zind // R('load', 1.0))['out']
@@ -0,0 +1,67 @@
+"""
+Test the batch evaluation module.
+"""
+
+import pickle
+
+import pytest
+from pytest import approx
+from fastz.batch import evaluate
+from fastz.montecarlo import simulate
+import numpy as np
+from networks import smps_zout_tol
+
+
+class TestEvaluate:
+    def test_local(self):
+        z = smps_zout_tol()
+        ff = np.logspace(2, 7, 100)
+        rr = np.linspace(0.1, 10, 50)
+        zz = evaluate(z, ff, chunk=16, Rload=rr, Cout=47e-6)
+        assert zz.shape == (50, 100)
+        assert zz == approx(z(ff, Rload=rr, Cout=47e-6))
+        assert evaluate(z, ff, magnitude=True, Rload=rr) == approx(abs(z(ff, Rload=rr)))
+
+    def test_workers(self):
+        z = smps_zout_tol()
+        ff = np.logspace(2, 7, 100)
+        rr = np.linspace(0.1, 10, 50)
+        cc = np.linspace(10e-6, 100e-6, 50)
+        zz = evaluate(z, ff, workers=2, chunk=8, Rload=rr, Cout=cc)
+        assert zz == approx(z(ff, Rload=rr, Cout=cc))
+        mm = evaluate(z, ff, workers=2, chunk=8, magnitude=True, Rload=rr)
+        assert mm == approx(abs(z(ff, Rload=rr)))
+
+    def test_montecarlo_workers(self):
+        z = smps_zout_tol()
+        ff = np.logspace(2, 7, 100)
+        local = simulate(z, ff, 200, seed=3, chunk=64)
+        pooled = simulate(z, ff, 200, seed=3, chunk=64, workers=2)
+        assert pooled.mag == approx(local.mag)
+
+    def test_dtype(self):
+        z = smps_zout_tol()
+        ff = np.logspace(2, 7, 100)
+        rr = np.linspace(0.1, 10, 50)
+        zz = evaluate(z, ff, chunk=16, dtype=np.complex64, Rload=rr)
+        assert zz.dtype == np.complex64
+        assert zz == approx(z(ff, Rload=rr), rel=1e-5)
+        mm = evaluate(z, ff, workers=2, chunk=8, magnitude=True, dtype=np.complex64, Rload=rr)
+        assert mm.dtype == np.float32
+        assert mm == approx(abs(z(ff, Rload=rr)), rel=1e-5)
+        assert simulate(z, ff, 100, seed=3, dtype=np.complex64).mag.dtype == np.float32
+
+    def test_lengths(self):
+        with pytest.raises(ValueError):
+            evaluate(smps_zout_tol(), np.logspace(2, 7, 100), Rload=np.ones(3), Cout=np.ones(4))
+        with pytest.raises(ValueError):
+            evaluate(smps_zout_tol(), np.logspace(2, 7, 100), Rload=1.0)
+
+    def test_pickle_drops_plan(self):
+        z = smps_zout_tol()
+        ff = np.logspace(2, 7, 100)
+        z(ff, out=np.empty(100, dtype=complex))
+        assert z._plan is not None
+        z2 = pickle.loads(pickle.dumps(z))
+        assert z2._plan is None
+        assert z2(ff) == approx(z(ff))
@@ -0,0 +1,94 @@
+"""
+Test the sub-tree evaluation cache.
+"""
+
+from pytest import approx
+from fastz.core import R, L, C, FrequencyGrid
+from fastz.cache import EvalCache
+import numpy as np
+from networks import smps_zout
+
+
+class TestEvalCache:
+    def test_sweep(self):
+        z = smps_zout()
+        grid = FrequencyGrid(np.logspace(1, 8, 1000))
+        cache = EvalCache()
+        assert z(grid, cache=cache, Rload=1.0) == approx(z(grid, Rload=1.0))
+        assert (cache.hits, cache.misses) == (0, 3)
+        for r in (0.5, 2.0, 4.0):
+            assert z(grid, cache=cache, Rload=r) == approx(z(grid, Rload=r))
+        # only the root depends on Rload; Zcap and Zind come from the cache
+        assert (cache.hits, cache.misses) == (6, 6)
+        assert z(grid, cache=cache, Rload=2.0) == approx(z(grid, Rload=2.0))
+        assert (cache.hits, cache.misses) == (7, 6)
+        assert cache.hit_rate == approx(7 / 13)
+
+    def test_array_params(self):
+        z = smps_zout()
+        grid = FrequencyGrid(np.logspace(1, 8, 100))
+        cache = EvalCache()
+        rr = np.linspace(0.1, 10, 5)
+        assert z(grid, cache=cache, Rload=rr) == approx(z(grid, Rload=rr))
+        assert z(grid, cache=cache, Rload=rr) == approx(z(grid, Rload=rr))
+        assert z(grid, cache=cache, Rload=rr * 2) == approx(z(grid, Rload=rr * 2))
+        assert (cache.hits, cache.misses) == (3, 4)
+
+    def test_scalar_arrays(self):
+        z = smps_zout()
+        grid = FrequencyGrid(np.logspace(1, 8, 100))
+        cache = EvalCache()
+        assert z(grid, cache=cache, Rload=np.array(2.0)) == approx(z(grid, Rload=2.0))
+        assert z(grid, cache=cache, Rload=np.float64(2.0)) == approx(z(grid, Rload=2.0))
+        assert z(grid, cache=cache, Rload=2.0) == approx(z(grid, Rload=2.0))
+        assert (cache.hits, cache.misses) == (2, 3)
+
+    def test_grid(self):
+        z = smps_zout()
+        cache = EvalCache()
+        z(np.logspace(1, 8, 100), cache=cache)
+        z(np.logspace(1, 8, 100), cache=cache)
+        assert (cache.hits, cache.misses) == (1, 3)
+        assert z(np.logspace(1, 7, 100), cache=cache) == approx(z(np.logspace(1, 7, 100)))
+        assert (cache.hits, cache.misses) == (1, 6)
+
+    def test_eviction(self):
+        z = smps_zout()
+        grid = FrequencyGrid(np.logspace(1, 8, 1000))
+        cache = EvalCache(maxbytes=2 * 16 * 1000)
+        z(grid, cache=cache)
+        assert len(cache) == 2
+        assert cache.nbytes == 2 * 16 * 1000
+        assert cache.evictions == 1
+        cache.clear()
+        assert len(cache) == cache.nbytes == cache.hits == cache.misses == cache.evictions == 0
+
+    def test_mutation(self):
+        zcap = (R('esr', 5e-3) + C('out', 100e-6))['cap']
+        z = zcap // R('load', 1.0)
+        ff = np.logspace(1, 8, 100)
+        cache = EvalCache()
+        z(ff, cache=cache)
+        zcap.merge(L('esl', 1e-9))
+        assert z(ff, cache=cache) == approx(z(ff))
+        assert cache.hits == 0
+
+    def test_result_is_copy(self):
+        z = smps_zout()
+        ff = np.logspace(1, 8, 100)
+        cache = EvalCache()
+        zz = z(ff, cache=cache)
+        zz[:] = 0
+        assert z(ff, cache=cache) == approx(z(ff))
+
+
+class TestFrozen:
+    def test_shared_entries(self):
+        def build():
+            return ((R('1', v=10) + L('1', v=100e-6))['s'] // C('1', v=10e-6)).freeze()
+        cache = EvalCache()
+        ff = FrequencyGrid(np.logspace(1, 8, 100))
+        z1 = build()(ff, cache=cache)
+        misses = cache.misses
+        assert build()(ff, cache=cache) == approx(z1)
+        assert cache.misses == misses
@@ -0,0 +1,66 @@
+"""
+Test the compact network representation.
+"""
+
+import pickle
+import pytest
+from pytest import approx
+from fastz.core import R, L, C, SeriesZ, ParallelZ
+from fastz.compact import CompactNetwork
+import numpy as np
+
+
+def decap(k: int):
+    Zcap = (R('esr', 5e-3 * (k + 1)) + L('esl', 1e-9) + C('out', 100e-6 / (k + 1)))['cap']
+    Zind = (R('dcr', 10e-3) + L(k, 2.2e-6))['ind']
+    return (Zcap // Zind // R('load'))['out']
+
+
+class TestCompactNetwork:
+    def test_roundtrip(self):
+        zball = (R('p', v=1.8e-3) + L('p', v=64e-12))['ball']
+        z = (zball // zball // C(1, v=1e-9) // C('1', v=2e-9))['in']
+        net = CompactNetwork.from_trees([z, decap(0)])
+        assert len(net) == 2
+        z2 = net[0]
+        assert str(z2) == str(z)
+        assert z2._children[0] is z2._children[1]
+        assert z2.subz('C1').value == 1e-9 and z2._children[2].subscript == 1
+        assert str(net[1]) == str(decap(0))
+        assert net[1].subz('Rload').value is None
+
+    def test_evaluate(self):
+        trees = [decap(k) for k in range(20)]
+        net = CompactNetwork.from_trees(trees)
+        ff = np.logspace(2, 7, 100)
+        zz = net.evaluate(ff, chunk=7, Rload=1.0)
+        assert zz.shape == (20, 100)
+        for z, row in zip(trees, zz):
+            assert row == approx(z(ff, Rload=1.0))
+        rr = np.linspace(0.1, 2, 20)
+        zz = net.evaluate(ff, Rload=rr)
+        assert zz[5] == approx(trees[5](ff, Rload=rr[5]))
+        assert net.evaluate(42e3, Rload=1.0)[3] == approx(trees[3](42e3, Rload=1.0))
+        assert net.evaluate(ff, dtype=np.complex64, Rload=1.0).dtype == np.complex64
+        with pytest.raises(ValueError):
+            net.evaluate(ff)
+        with pytest.raises(ValueError):
+            net.evaluate(ff, Rload=np.ones(3))
+
+    def test_save_load(self, tmp_path):
+        net = CompactNetwork.from_trees([decap(k) for k in range(5)])
+        net.save(str(tmp_path / 'net'))
+        loaded = CompactNetwork.load(str(tmp_path / 'net'))
+        assert isinstance(loaded.values, np.memmap)
+        ff = np.logspace(2, 7, 10)
+        assert loaded.evaluate(ff, Rload=1.0) == approx(net.evaluate(ff, Rload=1.0))
+        unpickled = pickle.loads(pickle.dumps(net))
+        assert str(unpickled[4]) == str(decap(4))
+
+    def test_unsupported(self):
+        class Z2(SeriesZ):
+            pass
+        with pytest.raises(TypeError):
+            CompactNetwork.from_tree(Z2(R(1, v=1), R(2, v=1)))
+        with pytest.raises(ValueError):
+            CompactNetwork.from_tree(ParallelZ(R(1, v=np.ones(2)), R(2, v=1)))
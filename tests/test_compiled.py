@@ -0,0 +1,413 @@
+"""
+Test the compiled evaluation plans.
+"""
+
+import pytest
+from pytest import approx
+from fastz.core import R, L, C
+from fastz.compiled import CompiledZ
+import numpy as np
+from networks import smps_zout
+
+
+class TestCompiledZ:
+    def test_compile(self):
+        z = smps_zout()
+        plan = z.compile()
+        assert type(plan) is CompiledZ
+        assert plan.label == 'Zout'
+        assert len(plan) == 9
+        assert plan.labels == ['Resr', 'Lesl', 'Cout', 'Rdcr', 'Lout', 'Rload']
+
+    def test_frequency_response(self):
+        z = smps_zout()
+        plan = z.compile()
+        f = 42e3
+        ff = np.logspace(1, 8, 1000)
+        assert plan(f) == approx(z(f))
+        assert plan(ff) == approx(z(ff))
+
+    def test_lumpedparam(self):
+        z = smps_zout()
+        plan = z.compile()
+        ff = np.logspace(1, 8, 1000)
+        assert plan(ff, Rload=0.1, Cout=47e-6) == approx(z(ff, Rload=0.1, Cout=47e-6))
+
+    def test_shared_label(self):
+        zball = (R('p', 1.8e-3) + L('p', 64e-12))['ball']
+        z = zball // zball // zball // zball
+        plan = z.compile()
+        ff = np.logspace(7, 10, 100)
+        assert plan.labels == ['Rp', 'Lp']
+        assert plan(ff, Rp=1e-3) == approx(z(ff, Rp=1e-3))
+
+    def test_missing_value(self):
+        plan = (R() + C('1', 1e-6)).compile()
+        with pytest.raises(ValueError):
+            plan(1e3)
+        assert plan(1e3, R=2.0) == approx(2.0 + 1 / (1j * 2 * np.pi * 1e3 * 1e-6))
+
+    def test_leaf(self):
+        plan = L('1', 1e-6).compile()
+        assert plan(42e3) == approx(1j * 2 * np.pi * 42e3 * 1e-6)
+
+    def test_deep_tree(self):
+        z = R('0', 1.0)
+        for i in range(1, 2000):
+            z = (z + R(i, 1.0))[i] if i % 2 else (z // R(i, 1.0))[i]
+        plan = z.compile()
+        assert np.isfinite(plan(1e3))
+
+    def test_out(self):
+        z = smps_zout()
+        plan = z.compile()
+        ff = np.logspace(1, 8, 1000)
+        buf = np.empty_like(ff, dtype=complex)
+        assert plan(ff, out=buf) is buf
+        assert buf == approx(z(ff))
+        arena = plan._registers(ff.shape)[1:]
+        assert plan(ff, out=buf, Rload=0.5) is buf
+        assert buf == approx(z(ff, Rload=0.5))
+        assert all(a is b for a, b in zip(plan._registers(ff.shape)[1:], arena))
+        # a frequency buffer refilled in place is read afresh on every call
+        ff *= 10
+        assert z(ff, out=buf) is buf and buf == approx(z(ff))
+        assert z(ff, threads=2) == approx(z(ff))
+        assert z(ff, backend='numpy') == approx(z(ff))
+        with pytest.raises(ValueError):
+            plan(ff, out=np.empty(10, dtype=complex))
+        with pytest.raises(ValueError):
+            plan(ff, out=np.empty_like(ff))
+
+    def test_depth(self):
+        assert smps_zout().compile().depth == 3
+        assert R(v=1).compile().depth == 1
+
+    def test_sweep(self):
+        z = smps_zout()
+        plan = z.compile()
+        ff = np.logspace(1, 8, 1000)
+        rr = np.linspace(0.1, 10, 20)
+        zz = plan(ff, Rload=rr)
+        assert zz.shape == (20, 1000)
+        assert zz == approx(z(ff, Rload=rr))
+        assert zz[3] == approx(z(ff, Rload=rr[3]))
+        assert plan(ff, Rload=rr, Cout=rr * 1e-5) == approx(z(ff, Rload=rr, Cout=rr * 1e-5))
+        assert plan(42e3, Rload=rr) == approx(z(42e3, Rload=rr))
+        buf = np.empty((20, 1000), dtype=complex)
+        assert plan(ff, out=buf, Rload=rr) is buf
+        assert buf == approx(zz)
+        with pytest.raises(ValueError):
+            plan(ff, Rload=rr, Cout=np.ones(3))
+
+    def test_array_default(self):
+        z = (R('a', np.array([1.0, 2.0, 3.0])) // R('b', 2.0)) + L('x', 1e-6)
+        plan = z.compile()
+        ff = np.logspace(3, 6, 50)
+        zz = z(ff)
+        assert zz.shape == (3, 50)
+        assert plan(ff) == approx(zz)
+        assert plan(1e4) == approx(z(1e4))
+        assert z(ff, out=np.empty((3, 50), dtype=complex)) == approx(zz)
+        assert z(ff, threads=2) == approx(zz)
+        assert plan(ff, Ra=np.array([1.0, 2.0])) == approx(z(ff, Ra=np.array([1.0, 2.0])))
+
+    def test_threads(self):
+        z = smps_zout()
+        plan = z.compile()
+        ff = np.logspace(1, 8, 10000)
+        assert plan(ff, threads=4, chunk=1000) == approx(z(ff))
+        assert plan(ff, threads=4, chunk=999) == approx(z(ff))
+        assert plan(ff, threads=2) == approx(z(ff))
+        rr = np.linspace(0.1, 10, 5)
+        buf = np.empty((5, 10000), dtype=complex)
+        assert plan(ff, out=buf, threads=3, chunk=1500, Rload=rr) is buf
+        assert buf == approx(z(ff, Rload=rr))
+        assert plan(42e3, threads=2) == approx(z(42e3))
+
+    def test_iter_eval_range(self):
+        z = smps_zout()
+        plan = z.compile()
+        chunks = list(plan.iter_eval((10.0, 1e8, 2500, 'log'), chunk=1000))
+        assert [len(ff) for ff, _ in chunks] == [1000, 1000, 500]
+        ff = np.concatenate([ff for ff, _ in chunks])
+        zz = np.concatenate([zz for _, zz in chunks])
+        assert ff == approx(np.geomspace(10.0, 1e8, 2500))
+        assert zz == approx(z(ff))
+        ff = np.concatenate([ff for ff, _ in plan.iter_eval((1.0, 1e6, 2001), chunk=1000)])
+        assert ff == approx(np.linspace(1.0, 1e6, 2001))
+        with pytest.raises(ValueError):
+            list(plan.iter_eval((0.0, 1e6, 10, 'log')))
+        with pytest.raises(ValueError):
+            list(plan.iter_eval((1.0, 1e6, 10, 'exp')))
+        ff = np.concatenate([ff for ff, _ in plan.iter_eval((1.0, 1e6, 3e3, 'log'))])
+        assert ff == approx(np.geomspace(1.0, 1e6, 3000))
+        (ff, _), = plan.iter_eval((1e3, 1e6, 1))
+        assert ff.dtype == float and ff == approx([1e3])
+        for spec in [(1.0, 1e6, 10.5), (1.0, 1e6, 0), (1.0, 1e6, '10'), (1.0, 1e6, None), (1.0, 1e6)]:
+            with pytest.raises(ValueError):
+                list(plan.iter_eval(spec))
+
+    def test_iter_eval_memmap(self, tmp_path):
+        z = smps_zout()
+        ff = np.logspace(1, 8, 2500)
+        np.save(tmp_path / 'ff.npy', ff)
+        mm = np.load(tmp_path / 'ff.npy', mmap_mode='r')
+        chunks = list(z.compile().iter_eval(mm, chunk=1000, Rload=0.5))
+        assert [len(ff) for ff, _ in chunks] == [1000, 1000, 500]
+        assert np.concatenate([zz for _, zz in chunks]) == approx(z(ff, Rload=0.5))
+
+    def test_iter_eval_generator(self):
+        z = smps_zout()
+        ff = np.logspace(1, 8, 2500)
+        source = (ff[i:i + 300] if i % 600 else float(ff[i]) for i in range(0, 2500, 300))
+        chunks = list(z.iter_eval(source, chunk=1000))
+        expected = np.concatenate([np.atleast_1d(ff[i:i + 300] if i % 600 else ff[i]) for i in range(0, 2500, 300)])
+        assert all(len(ff) == 1000 for ff, _ in chunks[:-1])
+        assert np.concatenate([ff for ff, _ in chunks]) == approx(expected)
+        assert np.concatenate([zz for _, zz in chunks]) == approx(z(expected))
+
+    def test_shared_subtree(self):
+        zball = (R('p', v=1.8e-3) + L('p', v=64e-12))['ball']
+        zpkg = (zball // zball // zball // zball)['pkg']
+        zin = (zpkg // (C('d', v=1e-9) + R('d', v=40e-3))['die'])['in']
+        plan = zin.compile()
+        assert plan.shared == 1
+        # one evaluation of the ball, three loads, the die branch, and the two parallel reductions
+        assert len(plan) == 3 + 1 + 3 + 3 + 2
+        ff = np.logspace(7, 10, 1000)
+        assert plan(ff) == approx(zin(ff))
+        assert plan(ff, Rp=1e-3, Cd=2e-9) == approx(zin(ff, Rp=1e-3, Cd=2e-9))
+
+    def test_identical_subtrees(self):
+        def decap(i):
+            return (R('esr', 5e-3) + L('esl', 1e-9) + C('out', 100e-6))[i]
+        z = (decap(1) // decap(2) // decap(3) // (L('esl', 1e-9) + C('out', 100e-6) + R('esr', 5e-3)))['out']
+        plan = z.compile()
+        assert plan.shared == 1
+        ff = np.logspace(1, 8, 1000)
+        assert plan(ff) == approx(z(ff))
+        assert plan(ff, Cout=47e-6) == approx(z(ff, Cout=47e-6))
+
+    def test_distinct_subtrees(self):
+        z = (R('1', 1.0) + C('1', 1e-6)) // (R('1', 2.0) + C('1', 1e-6)) // (R('2', 1.0) + C('1', 1e-6))
+        plan = z.compile()
+        assert plan.shared == 0
+        assert plan(np.logspace(1, 8, 100)) == approx(z(np.logspace(1, 8, 100)))
+
+    def test_codegen(self):
+        z = smps_zout()
+        ff = np.logspace(1, 8, 1000)
+        s = 1j * 2 * np.pi * ff
+        f = z.compile().codegen('Rload', 'Cout')
+        assert 'Rload' in f.source and 'Resr' not in f.source
+        assert f(s) == approx(z(ff))
+        assert f(s, 0.5, 47e-6) == approx(z(ff, Rload=0.5, Cout=47e-6))
+        assert f(s[0], Cout=47e-6) == approx(z(ff[0], Cout=47e-6))
+
+    def test_codegen_missing_value(self):
+        z = (R() + L('1', 1e-6)) // C('1', 1e-9)
+        f = z.compile().codegen()
+        ff = np.logspace(1, 8, 100)
+        assert f(1j * 2 * np.pi * ff, 2.0) == approx(z(ff, R=2.0))
+        assert R(v=2.0).compile().codegen()(1j * ff) == approx(2.0 * np.ones_like(ff))
+        with pytest.raises(KeyError):
+            z.compile().codegen('Rx')
+        with pytest.raises(ValueError):
+            R('-', 1.0).compile().codegen('R-')
+
+    def test_codegen_array_default(self):
+        rr = np.array([1.0, 2.0, 3.0])
+        z = (R('a', rr) + L('1', 1e-6)) // C('1', 1e-9)
+        f = z.compile().codegen()
+        assert 'Ra' in f.source.splitlines()[0] and 'Ra=' not in f.source
+        ff = np.logspace(1, 8, 100)
+        assert f(1j * 2 * np.pi * ff, 2.0) == approx(z(ff, Ra=2.0))
+        assert f(1j * 2 * np.pi * ff, rr[:, None]) == approx(z(ff))
+        with pytest.raises(ZeroDivisionError):
+            f(0j, 2.0)
+
+    def test_codegen_cache(self):
+        zcap = (R('esr', 5e-3) + C('out', 100e-6))['cap']
+        z = zcap // R('load', 1.0)
+        f = z.codegen('Rload')
+        assert z.codegen('Rload') is f
+        assert z.codegen() is not f
+        zcap.merge(L('esl', 1e-9))
+        g = z.codegen('Rload')
+        assert g is not f
+        ff = np.logspace(1, 8, 100)
+        assert g(1j * 2 * np.pi * ff, 2.0) == approx(z(ff, Rload=2.0))
+
+
+class TestSinglePrecision:
+    def test_dtype(self):
+        z = smps_zout()
+        plan = z.compile()
+        ff = np.logspace(1, 8, 1000)
+        zz = plan(ff, dtype=np.complex64)
+        assert zz.dtype == np.complex64
+        assert zz == approx(z(ff), rel=1e-5)
+        assert plan(ff, dtype=np.complex64, Cout=np.array([1e-6, 2e-6])).dtype == np.complex64
+        assert plan(ff, dtype=np.complex64, threads=2).dtype == np.complex64
+        assert plan(ff, dtype=np.complex64, backend='numba').dtype == np.complex64
+
+    def test_out(self):
+        z = smps_zout()
+        plan = z.compile()
+        ff = np.logspace(1, 8, 1000)
+        buf = np.empty_like(ff, dtype=np.complex64)
+        assert plan(ff, out=buf) is buf
+        assert buf == approx(z(ff), rel=1e-5)
+        with pytest.raises(ValueError):
+            plan(ff, out=buf, dtype=complex)
+
+
+class TestSensitivities:
+    def test_finite_differences(self):
+        z = smps_zout()
+        plan = z.compile()
+        ff = np.logspace(1, 8, 200)
+        zz, dz = plan.eval_with_sensitivities(ff, ['Rload', 'Cout', 'Lout', 'Resr'])
+        assert zz == approx(z(ff))
+        for label, v in [('Rload', 1.0), ('Cout', 100e-6), ('Lout', 2.2e-6), ('Resr', 5e-3)]:
+            h = v * 1e-6
+            fd = (z(ff, **{label: v + h}) - z(ff, **{label: v - h})) / (2 * h)
+            # finite differences lose precision where the derivative is tiny relative to the impedance
+            assert dz[label] == approx(fd, rel=1e-4, abs=1e-4 * np.abs(fd).max())
+
+    def test_shared(self):
+        zball = (R('p', v=1.8e-3) + L('p', v=64e-12))['ball']
+        z = (zball // zball // C('d', v=1e-9))['in']
+        ff = np.logspace(7, 10, 50)
+        zz, dz = z.eval_with_sensitivities(ff, 'Rp Cd', Rp=np.array([1e-3, 2e-3]))
+        assert zz.shape == dz['Rp'].shape == dz['Cd'].shape == (2, 50)
+        h = 1e-9
+        fd = (z(ff, Rp=2e-3 + h) - z(ff, Rp=2e-3 - h)) / (2 * h)
+        assert dz['Rp'][1] == approx(fd, rel=1e-4)
+
+    def test_unknown(self):
+        with pytest.raises(KeyError):
+            smps_zout().eval_with_sensitivities(42e3, ['Rnope'])
+        zz, dz = smps_zout().eval_with_sensitivities(42e3, [])
+        assert zz == approx(smps_zout()(42e3)) and dz == {}
+
+
+class TestGradient:
+    def test_gradient(self):
+        z = smps_zout()
+        plan = z.compile()
+        ff = np.logspace(2, 7, 100)
+        target = abs(z(ff, Rload=0.5, Cout=47e-6))
+        weights = np.linspace(1, 2, 100)
+
+        def objective(**params):
+            return np.sum(weights * (abs(z(ff, **params)) - target) ** 2)
+
+        loss, grad = plan.gradient(ff, target, weights)
+        assert loss == approx(objective())
+        assert set(grad) == set(plan.labels)
+        for label, v in [('Rload', 1.0), ('Cout', 100e-6), ('Lout', 2.2e-6), ('Resr', 5e-3), ('Lesl', 1e-9)]:
+            h = v * 1e-6
+            fd = (objective(**{label: v + h}) - objective(**{label: v - h})) / (2 * h)
+            assert grad[label] == approx(fd, rel=1e-4)
+
+    def test_shared_and_sweep(self):
+        zball = (R('p', v=1.8e-3) + L('p', v=64e-12))['ball']
+        z = (zball // zball // C('d', v=1e-9))['in']
+        ff = np.logspace(7, 10, 50)
+        rr = np.array([1e-3, 2e-3])
+        cotangent = np.exp(1j * np.linspace(0, 3, 50))
+        grad = z.compile().backward(ff, cotangent, Rp=rr)
+        assert np.shape(grad['Rp']) == (2,) and np.shape(grad['Cd']) == ()
+        _, dz = z.eval_with_sensitivities(ff, ['Rp', 'Cd'], Rp=rr)
+        assert grad['Rp'] == approx(np.sum(np.real(np.conj(cotangent) * dz['Rp']), axis=-1))
+        assert grad['Cd'] == approx(np.sum(np.real(np.conj(cotangent) * dz['Cd'])))
+
+    def test_array_default(self):
+        rr = np.array([1e-3, 2e-3, 5e-3])
+        z = (R('p', v=rr) + L('p', v=64e-12)) // C('d', v=1e-9)
+        ff = np.logspace(7, 10, 50)
+        cotangent = np.exp(1j * np.linspace(0, 3, 50))
+        grad = z.compile().backward(ff, cotangent)
+        assert np.shape(grad['Rp']) == (3,) and np.shape(grad['Cd']) == ()
+        assert grad['Rp'] == approx(z.compile().backward(ff, cotangent, Rp=rr)['Rp'])
+        _, dz = z.eval_with_sensitivities(ff, ['Rp'])
+        assert grad['Rp'] == approx(np.sum(np.real(np.conj(cotangent) * dz['Rp']), axis=-1))
+        loss, grad = z.compile().gradient(ff, abs(z(ff, Rp=1e-3)))
+        assert np.shape(grad['Rp']) == (3,) and loss == approx(np.sum((abs(z(ff)) - abs(z(ff, Rp=1e-3))) ** 2))
+
+
+class TestAdmittance:
+    def test_forms(self):
+        zc = C('1', v=1e-6) // C('2', v=2e-6) // C('3', v=3e-6)
+        plan = zc.compile()
+        # capacitors in parallel are summed as admittances sC, with one inversion at the root
+        assert plan._forms[:3] == [True] * 3 and plan._flips[3] == () and plan._forms[plan._root]
+        ff = np.logspace(1, 8, 100)
+        assert plan(ff) == approx(zc(ff))
+
+    def test_ladder(self):
+        z = R('0', v=1.0)
+        for k in range(1, 8):
+            z = (z // C(k, v=k * 1e-9) + L(k, v=k * 1e-9))[k]
+        ff = np.logspace(5, 9, 200)
+        assert z.compile()(ff) == approx(z(ff))
+        assert z.compile()(ff, R0=np.array([0.5, 2.0]))[1] == approx(z(ff, R0=2.0))
+
+    def test_edge_cases(self):
+        import warnings
+        z = smps_zout()
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            zz = z.compile()(np.array([0.0, 1e3]), Rload=0.0)
+            assert zz == approx([0, 0])
+            zz = z.compile()(np.array([0.0, 1e3]))
+        assert zz[0] == approx(1 / (1 / 10e-3 + 1 / 1.0))
+
+    def test_composite_short_and_open(self):
+        import warnings
+        ff = np.array([0.0, 1e3])
+        zpkg = ((L('via', 1e-10) + L('esl', 1e-9)) // C('d', 1e-6))['pkg']
+        zrc = ((C('a', 1e-6) + R('a', 1.0)) // (L('b', 1e-9) + R('b', 0.0)))['rc']
+        zcc = ((C('1', 1e-6) + (C('2', 1e-6) // C('3', 1e-6))) // R('x', 1.0))['cc']
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            # composite shorts at f = 0 shunt the open capacitors; composite opens leave the resistor
+            for z, dc in ((zpkg, 0.0), (zrc, 0.0), (zcc, 1.0)):
+                zz = z.compile()(ff)
+                assert zz[0] == approx(dc)
+                assert zz[1] == approx(z(ff[1]))
+                assert z.compile()(ff, dtype=np.complex64)[0] == approx(dc)
+
+
+class TestConstants:
+    def test_folding(self):
+        zr = (R('1', v=1.0) // R('2', v=2.0) + R('3', v=3.0))['r']
+        z = (zr // L('1', v=1e-6) // C('1', v=1e-9))['1']
+        plan = z.compile()
+        # the resistive sub-tree is one folded block, skipped unless one of its resistors is overridden
+        assert plan._blocks[0][0] == 5 and plan._blocks[0][2] == approx(1 / (1 + 1 / 2) + 3)
+        ff = np.logspace(4, 9, 100)
+        assert plan(ff) == approx(z(ff))
+        assert plan(ff, R2=4.0) == approx(z(ff, R2=4.0))
+        assert plan(ff, R3=np.array([0.0, 1.0, 5.0]))[2] == approx(z(ff, R3=5.0))
+
+    def test_resistive(self):
+        z = (R('1', v=1.0) // R('2', v=2.0) + R('3'))['r']
+        ff = np.logspace(4, 9, 10)
+        assert z.compile()(ff, R3=3.0) == approx(z(ff, R3=3.0))
+        assert z.compile()(ff, R3=np.array([1.0, 3.0])).shape == (2, 10)
+        with pytest.raises(ValueError):
+            z.compile()(ff)
+
+    def test_shared(self):
+        zr = (R('a', v=1.0) + R('b', v=2.0))['r']
+        z = ((zr // R('c', v=3.0)) + ((zr + R('d', v=1.0)) // L('1', v=1e-6)))['1']
+        plan = z.compile()
+        assert plan.shared == 1
+        ff = np.logspace(4, 9, 50)
+        assert plan(ff) == approx(z(ff))
+        assert plan(ff, Rd=2.0) == approx(z(ff, Rd=2.0))
+        assert plan(ff, Ra=5.0) == approx(z(ff, Ra=5.0))
+        assert plan(ff, Rc=0.5) == approx(z(ff, Rc=0.5))
@@ -7,10 +7,34 @@ import math
 
 import pytest
 from pytest import approx
-from fastz.core import R, L, C, SeriesZ, ParallelZ, CompositeZ
+from fastz.core import R, L, C, SeriesZ, ParallelZ, CompositeZ, FrequencyGrid
 import numpy as np
 
 
+class TestFrequencyGrid:
+    def test_laplace(self):
+        ff = np.logspace(1, 10, 1000)
+        grid = FrequencyGrid(ff)
+        assert grid.ff is ff
+        assert len(grid) == grid.size == 1000
+        assert grid.s == approx(1j*2*np.pi*ff)
+        assert grid.inv_s == approx(1/(1j*2*np.pi*ff))
+        assert grid.s is grid.s
+        assert grid.inv_s is grid.inv_s
+
+    def test_of(self):
+        grid = FrequencyGrid(42e3)
+        assert FrequencyGrid.of(grid) is grid
+        assert FrequencyGrid.of(42e3).ff == 42e3
+
+    def test_frequency_response(self):
+        ff = np.logspace(1, 10, 1000)
+        grid = FrequencyGrid(ff)
+        z = (R(v=10) + L(v=100e-6) + C(v=1e-6))['s'] // C('1', v=10e-6)
+        assert z(grid) == approx(z(ff))
+        assert z(grid, R=1.0) == approx(z(ff, R=1.0))
+
+
 class TestR:
     def test_label(self):
         subs = 'test'
@@ -249,3 +273,117 @@ class TestZ:
         assert z1.breakfreq('R C') == approx(1/2/math.pi/r.value/c.value)
         assert z1.breakfreq('R L') == approx(r.value/2/math.pi/l.value)
         assert z1.breakfreq('L C') == approx(1/2/math.pi/math.sqrt(l.value * c.value))
+
+    def test_call_out(self):
+        zs = (R('1', v=10) + L('1', v=100e-6))['s']
+        z1 = zs // C('1', v=10e-6)
+        ff = np.logspace(1, 8, 1000)
+        buf = np.empty_like(ff, dtype=complex)
+        assert z1(ff, out=buf) is buf
+        assert buf == approx(z1(ff))
+        zs.merge(C('2', v=1e-6))
+        assert z1(ff, out=buf) is buf
+        assert buf == approx(z1(ff))
+
+    def test_call_sweep(self):
+        z1 = (R('1', v=10) + L('1', v=100e-6))['s'] // C('1', v=10e-6)
+        ff = np.logspace(1, 8, 1000)
+        rr = np.linspace(1, 100, 50)
+        zz = z1(ff, R1=rr)
+        assert zz.shape == (50, 1000)
+        for r, z in zip(rr, zz):
+            assert z == approx(z1(ff, R1=r))
+        assert z1(42e3, R1=rr) == approx(np.array([z1(42e3, R1=r) for r in rr]))
+
+    def test_call_sweep_broadcast(self):
+        z1 = (R('1', v=10) + L('1', v=100e-6))['s'] // C('1', v=10e-6)
+        ff = np.logspace(1, 8, 100)
+        rr = np.linspace(1, 100, 5)
+        cc = np.array([1e-6, 10e-6, 100e-6])
+        zz = z1(ff, R1=rr[:, np.newaxis], C1=cc)
+        assert zz.shape == (5, 3, 100)
+        assert zz[2, 1] == approx(z1(ff, R1=rr[2], C1=cc[1]))
+
+    def test_call_threads(self):
+        z1 = (R('1', v=10) + L('1', v=100e-6))['s'] // C('1', v=10e-6)
+        ff = np.logspace(1, 8, 10000)
+        assert z1(ff, threads=2) == approx(z1(ff))
+
+    def test_call_dtype(self):
+        z1 = (R('1', v=10) + L('1', v=100e-6))['s'] // C('1', v=10e-6)
+        ff = np.logspace(1, 8, 1000)
+        zz = z1(ff, dtype=np.complex64)
+        assert zz.dtype == np.complex64
+        assert zz == approx(z1(ff), rel=1e-5)
+        assert z1(ff, dtype=np.complex64, R1=np.linspace(1, 100, 5)).dtype == np.complex64
+        assert z1(FrequencyGrid(ff, np.complex64), R1=np.float64(5)).dtype == np.complex64
+        assert R('1', v=10)(ff, dtype=np.complex64).dtype == np.float32
+        with pytest.raises(ValueError):
+            z1(ff, dtype=float)
+
+    def test_duplicate_labels(self):
+        zball = (R('p', v=1.8e-3) + L('p', v=64e-12))['ball']
+        r1, r2 = R('1', v=1.0), R('1', v=2.0)
+        z1 = ((zball // zball)['pkg'] + r1 + (r2 // C('1', v=1e-6))['x'])['1']
+        assert z1.duplicate_labels() == {'R1': [r1, r2]}
+        assert z1.subz('R1') is r1
+        assert z1.subz('Zball') is zball
+
+    def test_subz_index(self):
+        r, c = R('1', v=1.0), C('1', v=1e-6)
+        zp = (r // c)['p']
+        z1 = (zp + L('1', v=1e-6))['1']
+        assert z1.subz('C1') is c
+        c2 = C('2', v=1e-6)
+        zp.merge(c2)
+        assert z1.subz('C2') is c2
+        zp['q']
+        assert z1.subz('Zq') is zp
+        with pytest.raises(KeyError):
+            z1.subz('Zp')
+
+
+class TestFrozen:
+    def test_operators(self):
+        zs = (R('1', v=10) + L('1', v=100e-6)).freeze()
+        z1 = zs + C('1', v=1e-6)
+        assert len(zs._children) == 2 and len(z1._children) == 3
+        assert z1.frozen and z1._children[0] is zs._children[0]
+        z2 = zs // C('1', v=1e-6)
+        assert z2.frozen and z2._children[0] is zs
+        zp = zs['s']
+        assert zp is not zs and zs.label == 'Z' and zp.label == 'Zs'
+        assert zp._children is zs._children
+        with pytest.raises(AttributeError):
+            zs.subscript = 'x'
+        with pytest.raises(AttributeError):
+            cast(SeriesZ, zs).merge(R('2', v=1))
+        with pytest.raises(AttributeError):
+            zs._children[0].tolerance = 5
+
+    def test_hash(self):
+        def build():
+            zball = (R('p', v=1.8e-3) + L('p', v=64e-12))['ball']
+            return (zball // zball // C('d', v=1e-9))['in']
+        z1, z2 = build().freeze(), build().freeze()
+        assert z1 is not z2 and z1 == z2 and hash(z1) == hash(z2)
+        assert len({z1, z2}) == 1
+        assert z1 != z1['x'] and z1 != (build() // R('1', v=1)).freeze()
+        assert z1._children[0] is z1._children[1]
+        assert build() != build()
+
+    def test_evaluate(self):
+        z = (R('1', v=10) + L('1', v=100e-6))['s'] // C('1', v=10e-6)
+        frozen = z.freeze()
+        ff = np.logspace(1, 8, 100)
+        assert frozen(ff) == approx(z(ff))
+        plan = frozen._compiled()
+        z['x']
+        assert frozen._compiled() is plan
+        assert frozen.freeze() is frozen
+
+    def test_pickle(self):
+        import pickle
+        z = (R('1', v=10) + L('1', v=100e-6)).freeze()
+        z2 = pickle.loads(pickle.dumps(z))
+        assert z2.frozen and z2 == z and hash(z2) == hash(z)
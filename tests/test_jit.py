@@ -0,0 +1,46 @@
+"""
+Test the fused-loop evaluation kernel.
+"""
+
+import pytest
+from pytest import approx
+from fastz.core import R, L, C, FrequencyGrid
+from fastz import _jit
+import numpy as np
+
+
+def pkg():
+    zball = (R('p', v=1.8e-3) + L('p', v=64e-12))['ball']
+    zpkg = (zball // zball // zball // zball)['pkg']
+    return (zpkg // (C('d', v=1e-9) + R('d', v=40e-3))['die'])['in']
+
+
+class TestKernel:
+    def test_kernel(self):
+        # run the kernel as plain Python, so that it is checked whether or not numba is installed
+        z = pkg()
+        plan = z.compile()
+        ff = np.logspace(7, 10, 50)
+        result = np.empty(50, dtype=complex)
+        _jit.run(_jit._kernel, _jit.encode(plan._program), plan._nregisters, FrequencyGrid(ff),
+                 plan._resolve(FrequencyGrid(ff), {}), result)
+        assert result == approx(z(ff))
+
+    def test_kernel_sweep(self):
+        z = pkg()
+        plan = z.compile()
+        grid = FrequencyGrid(np.logspace(7, 10, 20))
+        rr = np.array([1e-3, 2e-3, 3e-3])
+        values = plan._resolve(grid, {'Rp': rr, 'Cd': np.array([[1e-9], [2e-9]])})
+        result = np.empty((2, 3, 20), dtype=complex)
+        _jit.run(_jit._kernel, _jit.encode(plan._program), plan._nregisters, grid, values, result)
+        assert result[1, 2] == approx(z(grid, Rp=3e-3, Cd=2e-9))
+
+    def test_backend(self):
+        z = pkg()
+        ff = np.logspace(7, 10, 1000)
+        assert z(ff, backend='numba') == approx(z(ff))
+        assert z(ff, backend='numba', threads=2, Rp=np.ones(3) * 1e-3) == approx(z(ff, Rp=np.ones(3) * 1e-3))
+        assert z.compile()(42e6, backend='numba') == approx(z(42e6))
+        with pytest.raises(ValueError):
+            z(ff, backend='cuda')
@@ -0,0 +1,63 @@
+"""
+Test incremental re-evaluation of impedances.
+"""
+
+import pytest
+from pytest import approx
+from fastz.core import R, L, C
+from fastz.live import LiveResponse
+import numpy as np
+
+
+def pdn():
+    def decap(i):
+        return (R('esr%d' % i, 5e-3) + L('esl%d' % i, 1e-9) + C(i, 100e-6 / i))[i]
+    zball = (R('p', v=1.8e-3) + L('p', v=64e-12))['ball']
+    return (zball // zball // decap(1) // decap(2) // decap(3))['pdn']
+
+
+class TestLiveResponse:
+    def test_initial(self):
+        z = pdn()
+        ff = np.logspace(3, 9, 500)
+        live = LiveResponse(z, ff, C2=10e-6)
+        assert live.z == approx(z(ff, C2=10e-6))
+        assert live() is live.z
+        assert live.params == {'C2': 10e-6}
+
+    def test_set_value(self):
+        z = pdn()
+        ff = np.logspace(3, 9, 500)
+        live = LiveResponse(z, ff)
+        before = live.z
+        after = live.set_value('Resr2', 20e-3)
+        assert after is live.z
+        assert after == approx(z(ff, Resr2=20e-3))
+        assert before == approx(z(ff))
+        assert live.update(Rp=1e-3, C3=1e-6) == approx(z(ff, Resr2=20e-3, Rp=1e-3, C3=1e-6))
+
+    def test_path_only(self, monkeypatch):
+        z = pdn()
+        live = LiveResponse(z, np.logspace(3, 9, 500))
+        evaluated = []
+        evaluate = live._evaluate
+        monkeypatch.setattr(live, '_evaluate', lambda node: evaluated.append(node.label) or evaluate(node))
+        live.set_value('Lesl1', 2e-9)
+        assert evaluated == ['Lesl1', 'Z1', 'Zpdn']
+
+    def test_unknown_label(self):
+        live = LiveResponse(pdn(), np.logspace(3, 9, 500))
+        with pytest.raises(KeyError):
+            live.set_value('Cx', 1e-6)
+
+    def test_mutation(self):
+        zcap = (R('esr', 5e-3) + C('out', 100e-6))['cap']
+        z = zcap // R('load', 1.0)
+        ff = np.logspace(3, 9, 500)
+        live = LiveResponse(z, ff)
+        zcap.merge(L('esl', 1e-9))
+        assert live.set_value('Rload', 2.0) == approx(z(ff, Rload=2.0))
+        zcap.merge(L('esl2', 1e-9))
+        with pytest.raises(KeyError):
+            live.set_value('Rnope', 3.0)
+        assert live.set_value('Lesl2', 2e-9) == approx(z(ff, Rload=2.0, Lesl2=2e-9))
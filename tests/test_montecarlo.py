@@ -0,0 +1,69 @@
+"""
+Test the Monte Carlo tolerance analysis module.
+"""
+
+import pytest
+from pytest import approx
+from fastz.core import R, C
+from fastz.montecarlo import Uniform, Normal, LogNormal, sample, simulate
+import numpy as np
+from networks import smps_zout_tol
+
+
+class TestTolerance:
+    def test_uniform(self):
+        vv = Uniform(10).sample(1e-6, 10000, np.random.default_rng(0))
+        assert vv.min() >= 0.9e-6
+        assert vv.max() <= 1.1e-6
+        assert vv.mean() == approx(1e-6, rel=1e-2)
+
+    def test_normal(self):
+        vv = Normal(30, sigmas=3).sample(10.0, 100000, np.random.default_rng(0))
+        assert vv.mean() == approx(10.0, rel=1e-2)
+        assert vv.std() == approx(1.0, rel=1e-2)
+
+    def test_lognormal(self):
+        vv = LogNormal(100, sigmas=1).sample(10.0, 100000, np.random.default_rng(0))
+        assert vv.min() > 0
+        assert np.median(vv) == approx(10.0, rel=1e-2)
+        assert np.log(vv).std() == approx(np.log(2), rel=1e-2)
+
+    def test_negative(self):
+        with pytest.raises(ValueError):
+            Uniform(-1)
+
+
+class TestSimulate:
+    def test_sample(self):
+        samples = sample(smps_zout_tol(), 100, seed=1)
+        assert set(samples) == {'Resr', 'Cout', 'Lout'}
+        assert all(vv.shape == (100,) for vv in samples.values())
+        assert samples['Cout'] == approx(sample(smps_zout_tol(), 100, seed=1)['Cout'])
+        assert sample(smps_zout_tol(), 100, seed=1, Cout=1e-3)['Cout'].mean() == approx(1e-3, rel=0.1)
+
+    def test_sample_missing_value(self):
+        with pytest.raises(ValueError):
+            sample(C(tol=Uniform(5)), 10)
+
+    def test_simulate(self):
+        z = smps_zout_tol()
+        ff = np.logspace(2, 7, 200)
+        result = simulate(z, ff, 1000, seed=2, chunk=300)
+        assert len(result) == 1000
+        assert result.mag.shape == (1000, 200)
+        for i in (0, 299, 300, 999):
+            params = {label: vv[i] for label, vv in result.samples.items()}
+            assert result.mag[i] == approx(abs(z(ff, **params)))
+        assert result.min.shape == result.max.shape == result.mean.shape == (200,)
+        assert np.all(result.min <= result.percentile(50))
+        assert np.all(result.percentile(50) <= result.max)
+        assert result.percentile([5, 95]).shape == (2, 200)
+        assert result.yield_below(result.max.max()) == 1.0
+        assert result.yield_below(0.0) == 0.0
+
+    def test_simulate_exact(self):
+        z = R('1', 1.0) + C('1', 1e-6)
+        ff = np.logspace(2, 7, 200)
+        result = simulate(z, ff, 10)
+        assert result.std == approx(np.zeros(200))
+        assert result.mean == approx(abs(z(ff)))
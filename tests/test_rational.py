@@ -0,0 +1,145 @@
+"""
+Test the rational-function representation of impedances.
+"""
+
+import json
+
+import pytest
+from pytest import approx
+from fastz.core import R, L, C
+from fastz.rational import RationalZ, to_rational, natural_frequencies
+import numpy as np
+from networks import smps_zout
+
+
+class TestRationalZ:
+    def test_leaves(self):
+        ff = np.logspace(1, 8, 100)
+        for z in (R(v=10.0), L(v=1e-6), C(v=1e-9)):
+            assert z.to_rational()(ff) == approx(z(ff))
+
+    def test_series_rlc(self):
+        r, l, c = R(v=10), L(v=100e-6), C(v=1e-6)
+        rz = (r + l + c).to_rational(scale=1.0)
+        num, den = rz.num / rz.den[0], rz.den / rz.den[0]
+        assert den == approx([1.0, 0.0])
+        assert num == approx([l.value, r.value, 1 / c.value])
+        assert rz.order == 2
+
+    def test_network(self):
+        z = smps_zout()
+        ff = np.logspace(1, 9, 1000)
+        rz = z.to_rational()
+        assert rz.order == 3
+        assert rz(ff) == approx(z(ff), rel=1e-9)
+        assert rz(42e3) == approx(z(42e3), rel=1e-9)
+        assert z.to_rational(Rload=0.1)(ff) == approx(z(ff, Rload=0.1), rel=1e-9)
+
+    def test_shared_branches(self):
+        zball = (R('p', v=1.8e-3) + L('p', v=64e-12))['ball']
+        zin = ((zball // zball // zball // zball)['pkg'] // (C('d', v=1e-9) + R('d', v=40e-3))['die'])['in']
+        rz = zin.to_rational()
+        assert rz.order == 2
+        ff = np.logspace(7, 10, 1000)
+        assert rz(ff) == approx(zin(ff), rel=1e-9)
+
+    def test_like_elements(self):
+        # combined inductors or capacitors are one inductance or capacitance, with no extra poles or zeros at s = 0
+        ll = (L('1', 1e-6) // L('2', 2e-6)).to_rational()
+        assert ll.order == 1
+        assert len(ll.poles()) == 0 and ll.zeros() == approx([0.0])
+        cc = (C('1', 1e-6) + C('2', 2e-6)).to_rational()
+        assert cc.order == 1
+        assert cc.poles() == approx([0.0]) and len(cc.zeros()) == 0
+        ff = np.logspace(1, 8, 100)
+        assert ll(ff) == approx(1j * 2 * np.pi * ff * 2e-6 / 3)
+        assert cc(ff) == approx(1 / (1j * 2 * np.pi * ff * 2e-6 / 3))
+
+    def test_high_order(self):
+        z = R('0', 1.0)
+        for i in range(1, 40):
+            z = (z + (L(i, 1e-9 * i) // C(i, 1e-6 / i))[i])
+        ff = np.logspace(5, 9, 500)
+        assert z.to_rational()(ff) == approx(z(ff), rel=1e-6)
+
+    def test_unscaled(self):
+        rz = (R(v=10) + L(v=100e-6) + C(v=1e-6)).to_rational()
+        num, den = rz.unscaled()
+        ff = np.logspace(1, 8, 100)
+        s = 1j * 2 * np.pi * ff
+        assert np.polyval(num, s) / np.polyval(den, s) == approx(rz(ff))
+
+    def test_serialize(self):
+        rz = smps_zout().to_rational()
+        rz2 = RationalZ.from_dict(json.loads(json.dumps(rz.to_dict())))
+        ff = np.logspace(1, 9, 100)
+        assert rz2(ff) == approx(rz(ff))
+        assert rz2.scale == rz.scale
+
+    def test_errors(self):
+        with pytest.raises(ValueError):
+            to_rational(smps_zout(), Rload=np.ones(3))
+        with pytest.raises(ValueError):
+            (R() + C(v=1e-6)).to_rational()
+        with pytest.raises(ValueError):
+            RationalZ([1.0], [0.0])
+
+
+class TestPoleResidueZ:
+    def test_poles_zeros(self):
+        r, l, c = R(v=10), L(v=100e-6), C(v=1e-6)
+        zs = r + l + c
+        w0 = 1 / np.sqrt(l.value * c.value)
+        assert zs.poles() == approx([0.0], abs=1e-6)
+        zeros = zs.zeros()
+        assert sorted(zeros.imag) == approx([-w0 * np.sqrt(1 - (r.value / 2 * np.sqrt(c.value / l.value)) ** 2),
+                                             w0 * np.sqrt(1 - (r.value / 2 * np.sqrt(c.value / l.value)) ** 2)])
+        assert natural_frequencies(zeros) == approx([w0 / 2 / np.pi])
+        assert natural_frequencies((r // l // c).poles()) == approx([w0 / 2 / np.pi])
+
+    def test_residues(self):
+        r, c = R(v=10), C(v=1e-6)
+        residues, poles, direct = (r // c).residues()
+        # R || C = (1/C) / (s + 1/RC)
+        assert poles == approx([-1 / r.value / c.value])
+        assert residues == approx([1 / c.value])
+        assert direct == approx([0.0])
+        residues, poles, direct = (r + c).residues()
+        assert poles == approx([0.0], abs=1e-6)
+        assert residues == approx([1 / c.value])
+        assert direct == approx([r.value])
+
+    def test_evaluate(self):
+        z = smps_zout()
+        ff = np.logspace(1, 9, 1000)
+        pr = z.to_rational().to_pole_residue()
+        assert len(pr) == 3
+        assert pr(ff) == approx(z(ff), rel=1e-8)
+        assert pr(42e3) == approx(z(42e3), rel=1e-8)
+
+    def test_improper(self):
+        z = L('1', 1e-6) + (R('1', 1.0) // C('1', 1e-6))
+        ff = np.logspace(1, 9, 1000)
+        residues, poles, direct = z.residues()
+        assert direct == approx([1e-6, 0.0], abs=1e-12)
+        assert z.to_rational().to_pole_residue()(ff) == approx(z(ff), rel=1e-8)
+
+    def test_repeated_poles(self):
+        # identical branches share their denominator rather than squaring it
+        z = (R('1', 1.0) // C('1', 1e-6)) + (R('2', 1.0) // C('2', 1e-6))
+        assert len(z.poles()) == 1
+        with pytest.raises(ValueError):
+            RationalZ([1.0], [1.0, 2.0, 1.0]).residues()
+
+    def test_like_elements(self):
+        # series capacitors and parallel inductors reduce to one element rather than raising repeated poles
+        residues, poles, direct = (C('1', 1e-6) + C('2', 2e-6)).residues()
+        assert poles == approx([0.0]) and residues == approx([1.5e6])
+        assert direct == approx([0.0])
+        residues, poles, direct = (L('1', 1e-6) // L('2', 2e-6)).residues()
+        assert len(poles) == 0 and direct == approx([2e-6 / 3, 0.0])
+        z = (L('1', 1e-6) // L('2', 2e-6) // R('1', 1.0)) + C('1', 1e-6) + C('2', 2e-6)
+        residues, poles, direct = z.residues()
+        assert sorted(poles.real) == approx([-1.5e6, 0.0])
+        ff = np.logspace(1, 9, 1000)
+        assert z.to_rational().to_pole_residue()(ff) == approx(z(ff), rel=1e-8)
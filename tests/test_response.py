@@ -0,0 +1,49 @@
+"""
+Test impedance response objects.
+"""
+
+import pytest
+from pytest import approx
+from fastz.response import ImpedanceResponse
+import numpy as np
+from networks import smps_zout
+
+
+class TestImpedanceResponse:
+    def test_response(self):
+        z = smps_zout()
+        ff = np.logspace(1, 8, 200)
+        zz = z(ff)
+        response = z.response(ff)
+        assert response.z == approx(zz)
+        assert response.mag == approx(abs(zz))
+        assert response.mag is response.mag
+        assert response.db == approx(20 * np.log10(abs(zz)))
+        assert response.phase_deg == approx(np.degrees(np.angle(zz)))
+        assert response.phase_deg is response.phase_deg
+        assert response.real == approx(zz.real) and np.shares_memory(response.real, response.z)
+        assert response.imag == approx(zz.imag)
+        assert response.admittance == approx(1 / zz)
+        assert np.asarray(response) is response.z
+        assert len(response) == 200 and response.shape == (200,)
+
+    def test_mag_only(self):
+        z = smps_zout()
+        ff = np.logspace(1, 8, 10000)
+        buf = np.empty(10000)
+        response = z.response(ff, mag_only=True, out=buf)
+        assert response.mag is buf and response.mag_only
+        assert buf == approx(abs(z(ff)))
+        assert response.db == approx(20 * np.log10(abs(z(ff))))
+        with pytest.raises(ValueError):
+            response.phase
+        rr = np.array([0.5, 1.0, 2.0])
+        mm = z.compile().magnitude(ff, chunk=999, Rload=rr)
+        assert mm.shape == (3, 10000) and mm[2] == approx(abs(z(ff, Rload=2.0)))
+        assert z.response(ff, mag_only=True, dtype=np.complex64).mag.dtype == np.float32
+        assert z.response(42e3, mag_only=True).mag == approx(abs(z(42e3)))
+
+    def test_construct(self):
+        with pytest.raises(ValueError):
+            ImpedanceResponse(np.ones(3))
+        assert ImpedanceResponse(1e3, z=1 + 1j).mag == approx(2 ** 0.5)
@@ -0,0 +1,40 @@
+"""
+Test topology templates.
+"""
+
+import pytest
+from pytest import approx
+import numpy as np
+from networks import smps_zout
+
+
+class TestTemplate:
+    def test_evaluate(self):
+        z = smps_zout(rload=None)
+        template = z.as_template()
+        assert template.columns == ['Resr', 'Lesl', 'Cout', 'Rdcr', 'Lout', 'Rload']
+        values = np.tile(template.defaults(), (30, 1))
+        assert np.isnan(values[0, template.index('Rload')])
+        values[:, template.index('Rload')] = np.linspace(0.1, 3, 30)
+        values[:, template.index('Cout')] = np.linspace(10e-6, 100e-6, 30)
+        ff = np.logspace(2, 7, 100)
+        zz = template.evaluate(ff, values)
+        assert zz.shape == (30, 100)
+        for row, v in zip(zz, values):
+            assert row == approx(z(ff, Rload=v[5], Cout=v[2]))
+        assert template.evaluate(ff, values, chunk=7) == approx(zz)
+
+    def test_columns(self):
+        z = smps_zout(rload=None)
+        template = z.as_template('Rload', 'Cout')
+        z['changed']
+        values = np.array([[1.0, 47e-6], [2.0, 22e-6]])
+        ff = np.logspace(2, 7, 10)
+        buf = np.empty((2, 10), dtype=np.complex64)
+        assert template.evaluate(ff, values, out=buf) is buf
+        assert buf[1] == approx(z(ff, Rload=2.0, Cout=22e-6), rel=1e-5)
+        assert template.evaluate(ff, values, Resr=0.1)[0] == approx(z(ff, Rload=1.0, Cout=47e-6, Resr=0.1))
+        with pytest.raises(ValueError):
+            template.evaluate(ff, np.ones((2, 3)))
+        with pytest.raises(KeyError):
+            z.as_template('Rnope')